@@ -93,24 +93,26 @@ OUTPUT FORMAT:
 """
 
 # Crisis detection patterns
+# Category order is priority order. Within a category, patterns and their
+# alternatives are listed rarest-first so common messages fail fast.
 CRISIS_PATTERNS = {
     "suicide": [
-        r"\b(want to die|kill myself|end it all|suicide|can't go on)\b",
-        r"\b(better off dead|no reason to live|wish I was dead)\b",
+        r"\b(no reason to live|better off dead|wish I was dead)\b",
+        r"\b(suicide|kill myself|end it all|want to die|can't go on)\b",
     ],
     "self_harm": [
-        r"\b(hurt myself|harm myself|cut myself|self[- ]harm)\b",
+        r"\b(self[- ]harm|cut myself|harm myself|hurt myself)\b",
     ],
     "ipv": [
-        r"\b(boyfriend|partner|husband).{0,20}(forcing|made me|threatening)\b",
-        r"\b(feel unsafe|scared of|afraid of|violent|hits me)\b",
+        r"\b(hits me|violent|feel unsafe|afraid of|scared of)\b",
+        r"\b(husband|boyfriend|partner).{0,20}(threatening|forcing|made me)\b",
     ],
     "coercion": [
-        r"\b(have to|forced to|no choice|making me|pressuring me)\b",
+        r"\b(pressuring me|forced to|no choice|making me|have to)\b",
     ],
     "medical_emergency": [
-        r"\b(heavy bleeding|soaking|hemorrhage|severe pain)\b",
-        r"\b(fever|infection|foul smell|very sick)\b",
+        r"\b(hemorrhage|soaking|heavy bleeding|severe pain)\b",
+        r"\b(foul smell|infection|very sick|fever)\b",
     ]
 }
 
@@ -1,7 +1,8 @@
 import os
 import json
 import re
-from typing import Tuple, Optional
+import sys
+from typing import List, Tuple, Optional
 from langchain_community.document_loaders import DirectoryLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 #from langchain_community.embeddings import HuggingFaceEmbeddings
@@ -30,6 +31,13 @@ except ImportError:
 
 import gradio as gr
 
+# RE2 guarantees linear-time matching and releases the GIL; fall back to the
+# stdlib engine when the optional binding is not installed.
+try:
+    import re2 as _regex
+except ImportError:
+    _regex = re
+
 
 #from summerizer import ConversationMemory
 
@@ -112,19 +120,78 @@ print("Welcome to your RAG chatbot! Type 'exit' or 'quit' to stop.")
 
 #detect crisis fuction from claude
 
+# One alternation per crisis category, compiled once at import. The inline
+# (?i) flag is understood by both re and re2. The bound search methods are
+# kept so the scan loop does no attribute lookups per call. Category names
+# are interned and indexed by position, so callers can go from a category
+# id straight to its escalation message without a dict lookup.
+_CRISIS_TYPES = tuple(sys.intern(crisis_type) for crisis_type in CRISIS_PATTERNS)
+_CRISIS_SEARCHES = tuple(
+    _regex.compile("(?i)" + "|".join(patterns)).search
+    for patterns in CRISIS_PATTERNS.values()
+)
+_CRISIS_RESPONSES = tuple(
+    ESCALATION_MESSAGES.get(crisis_type, ESCALATION_MESSAGES["coercion"])
+    for crisis_type in _CRISIS_TYPES
+)
+
+# Every pattern of every category fused into a single alternation, one named
+# group per pattern, so a message with no crisis indicators (the common case)
+# is rejected in a single scan. All patterns are wrapped in \b...\b, so the
+# boundaries are checked once around the whole alternation instead of once
+# per alternative; this matches exactly the same text.
+_GROUP_TO_CRISIS = {}
+_fused_alternatives = []
+for _crisis_id, _patterns in enumerate(CRISIS_PATTERNS.values()):
+    for _j, _pattern in enumerate(_patterns):
+        _group = f"c{_crisis_id}_{_j}"
+        _GROUP_TO_CRISIS[_group] = _crisis_id
+        _fused_alternatives.append((_group, _pattern))
+
+if all(p.startswith(r"\b") and p.endswith(r"\b") for _, p in _fused_alternatives):
+    _fused_pattern = r"(?i)\b(?:" + "|".join(
+        f"(?P<{group}>{pattern[2:-2]})" for group, pattern in _fused_alternatives
+    ) + r")\b"
+else:
+    _fused_pattern = "(?i)" + "|".join(
+        f"(?P<{group}>{pattern})" for group, pattern in _fused_alternatives
+    )
+_CRISIS_FUSED_SEARCH = _regex.compile(_fused_pattern).search
+
+def detect_crisis_id(text: str) -> int:
+    """
+    Detect crisis indicators in user message.
+    Returns: index of the matched category in CRISIS_PATTERNS, or -1
+    """
+    # Patterns are compiled case-insensitive, so the text is scanned as-is.
+    match = _CRISIS_FUSED_SEARCH(text)
+    if match is None:
+        return -1
+
+    crisis_id = _GROUP_TO_CRISIS[match.lastgroup]
+    # The leftmost match is not necessarily the highest-priority category,
+    # so confirm no earlier category matches elsewhere in the message.
+    for earlier_id in range(crisis_id):
+        if _CRISIS_SEARCHES[earlier_id](text):
+            return earlier_id
+    return crisis_id
+
 def detect_crisis(text: str) -> Tuple[Optional[str], bool]:
     """
     Detect crisis indicators in user message.
     Returns: (crisis_type, is_crisis)
     """
-    text_lower = text.lower()
-    
-    for crisis_type, patterns in CRISIS_PATTERNS.items():
-        for pattern in patterns:
-            if re.search(pattern, text_lower, re.IGNORECASE):
-                return crisis_type, True
-    
-    return None, False
+    crisis_id = detect_crisis_id(text)
+    if crisis_id < 0:
+        return None, False
+    return _CRISIS_TYPES[crisis_id], True
+
+def detect_crisis_batch(texts: List[str]) -> List[Tuple[Optional[str], bool]]:
+    """
+    Detect crisis indicators for a batch of messages.
+    Returns: one (crisis_type, is_crisis) tuple per input text, in order.
+    """
+    return [detect_crisis(text) for text in texts]
 
 #def build_structured_prompt(config, context, user_query, history=None):
 #     """
@@ -360,15 +427,11 @@ def get_response(user_query, lang, history=None):
         return "Escalating to a counsellor..."
     
     #Crisis detection
-    crisis_type, is_crisis = detect_crisis(user_query)
+    crisis_id = detect_crisis_id(user_query)
     
-    if is_crisis:
-        print(f"⚠️ CRISIS DETECTED: {crisis_type}")
-        escalation_msg = ESCALATION_MESSAGES.get(
-            crisis_type, 
-            ESCALATION_MESSAGES["coercion"]  # Default
-        )
-        return escalation_msg
+    if crisis_id >= 0:
+        print(f"⚠️ CRISIS DETECTED: {_CRISIS_TYPES[crisis_id]}")
+        return _CRISIS_RESPONSES[crisis_id]
 
     # Step 1: Retrieve relevant documents
     retrieved_docs = retriever.get_relevant_documents(user_query)
@@ -10,17 +10,26 @@ understand user intentions and route conversations appropriately.
 
 Key Features:
 - Pre-trained intent classification model using scikit-learn
-- TF-IDF vectorization for text feature extraction
+- TF-IDF vectorization for text feature extraction (vocabulary or feature hashing)
 - Confidence scoring for classification results
+- LRU cache of results for repeated messages
 - Fast inference optimized for real-time chatbot interactions
 - Automatic model loading on module import
+- NumPy fast path that scores TF-IDF features against the logistic regression
+  weights directly, bypassing the sparse-matrix sklearn call stack
+- Optional ONNX Runtime backend, used when onnxruntime is installed and
+  intent.onnx has been exported next to this module
 
 Main Functions:
 - detect_intent(): Classifies user message and returns intent with confidence
+- detect_intent_batch(): Classifies several messages in one vectorized call
+- intent_cache_info(): Hit/miss statistics of the detect_intent result cache
 
 Model Components:
 - intent_classifier.joblib: Pre-trained classification model
-- intent_vectorizer.joblib: TF-IDF vectorizer for text preprocessing
+- intent_vectorizer.joblib: TF-IDF vectorizer (or HashingVectorizer + TfidfTransformer
+  pipeline) for text preprocessing
+- intent.onnx: Optional ONNX export of both (see ml_intent_detection.export_onnx)
 
 Usage:
     from intent_inference import detect_intent
@@ -35,13 +44,24 @@ Usage:
 
 Dependencies:
 - joblib: For loading pre-trained models
+- numpy: For the fast scoring path
+- onnxruntime: Optional, for running intent.onnx
 - scikit-learn: Required by the loaded models (implicit)
 
 Author: Generated for local-llm-test-viac-bot project
 """
 
+import functools
 import joblib
 import os
+from collections import Counter
+
+import numpy as np
+
+try:
+    import onnxruntime as ort
+except ImportError:
+    ort = None
 
 # Get the directory where this script is located
 script_dir = os.path.dirname(os.path.abspath(__file__))
@@ -50,6 +70,154 @@ script_dir = os.path.dirname(os.path.abspath(__file__))
 clf = joblib.load(os.path.join(script_dir, "intent_classifier.joblib"))
 vectorizer = joblib.load(os.path.join(script_dir, "intent_vectorizer.joblib"))
 
+
+def _is_multinomial(model):
+    """Return True if predict_proba of the model is a softmax over coef_ scores."""
+    if len(model.classes_) == 2:
+        return True
+    multi_class = getattr(model, "multi_class", "auto")
+    if multi_class == "multinomial":
+        return True
+    if multi_class == "ovr":
+        return False
+    # 'auto' (and the post-1.5 'deprecated' default) is multinomial except for liblinear
+    return getattr(model, "solver", "lbfgs") != "liblinear"
+
+
+def _vocabulary_counter(vec):
+    """Return a function mapping a message to (column indices, term counts) via vocabulary_."""
+    analyzer = vec.build_analyzer()
+    vocab = vec.vocabulary_
+
+    def count_terms(user_message):
+        counts = Counter()
+        for token in analyzer(user_message):
+            col = vocab.get(token)
+            if col is not None:
+                counts[col] += 1
+        idx = np.fromiter(counts.keys(), dtype=np.intp, count=len(counts))
+        vals = np.fromiter(counts.values(), dtype=np.float64, count=len(counts))
+        return idx, vals
+
+    return count_terms
+
+
+def _hashing_counter(hasher):
+    """Return a function mapping a message to (column indices, term counts) via feature hashing."""
+    # HashingVectorizer.transform rebuilds its analyzer (recompiling the token
+    # pattern) and a FeatureHasher on every call; build both once instead.
+    # The hashes are identical to what the vectorizer produced at training time.
+    from sklearn.feature_extraction import FeatureHasher
+
+    analyzer = hasher.build_analyzer()
+    feature_hasher = FeatureHasher(
+        n_features=hasher.n_features,
+        input_type="string",
+        dtype=hasher.dtype,
+        alternate_sign=hasher.alternate_sign,
+    )
+    binary = getattr(hasher, "binary", False)
+
+    def count_terms(user_message):
+        x = feature_hasher.transform([analyzer(user_message)])
+        vals = x.data.astype(np.float64)
+        if binary:
+            vals[:] = 1.0
+        return x.indices, vals
+
+    return count_terms
+
+
+def _build_fast_path(model, vec):
+    """
+    Precompute everything detect_intent needs to score a message without sklearn.
+
+    Supports a fitted TfidfVectorizer, or a HashingVectorizer + TfidfTransformer
+    pipeline as written by ml_intent_detection.train(). Returns None when the
+    loaded models are anything else or the classifier is not a softmax logistic
+    regression; detect_intent then uses the sklearn path.
+    """
+    if not hasattr(model, "coef_") or not _is_multinomial(model):
+        return None
+
+    if hasattr(vec, "vocabulary_"):
+        count_terms = _vocabulary_counter(vec)
+        weighting = vec
+        binary = getattr(vec, "binary", False)
+    elif hasattr(vec, "steps") and len(vec.steps) == 2 and hasattr(vec.steps[1][1], "idf_"):
+        hasher = vec.steps[0][1]
+        if getattr(hasher, "alternate_sign", True) or getattr(hasher, "norm", "l2") is not None:
+            return None
+        count_terms = _hashing_counter(hasher)
+        weighting = vec.steps[1][1]
+        binary = False  # already applied by the hasher
+    else:
+        return None
+
+    coef = np.asarray(model.coef_)
+    intercept = np.asarray(model.intercept_)
+    if coef.shape[0] == 1:
+        # Binary models store one weight row; scoring [0, w.x + b] through a
+        # softmax reproduces predict_proba's sigmoid.
+        coef = np.vstack([np.zeros_like(coef), coef])
+        intercept = np.concatenate([np.zeros_like(intercept), intercept])
+
+    # float32 halves the memory traffic of the weight gather and is ample
+    # precision for a handful of classes. Stored feature-major so the rows
+    # picked out for a message's features are contiguous in memory.
+    coef_by_feature = np.ascontiguousarray(coef.T, dtype=np.float32)
+    intercept = np.ascontiguousarray(intercept, dtype=np.float32)
+
+    return {
+        "count_terms": count_terms,
+        "idf": np.asarray(weighting.idf_) if getattr(weighting, "use_idf", False) else None,
+        "binary": binary,
+        "sublinear_tf": getattr(weighting, "sublinear_tf", False),
+        "norm": getattr(weighting, "norm", None),
+        "coef_by_feature": coef_by_feature,
+        "intercept": intercept,
+        "classes": model.classes_,
+    }
+
+
+_fast_path = _build_fast_path(clf, vectorizer)
+
+
+def _load_onnx_session():
+    """Create the ONNX Runtime session for intent.onnx, or None if unavailable."""
+    onnx_path = os.path.join(script_dir, "intent.onnx")
+    if ort is None or not os.path.exists(onnx_path):
+        return None
+    so = ort.SessionOptions()
+    so.intra_op_num_threads = 1
+    so.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    return ort.InferenceSession(onnx_path, sess_options=so, providers=["CPUExecutionProvider"])
+
+
+_onnx_session = _load_onnx_session()
+
+
+def _fast_scores(user_message):
+    """Compute the logistic regression scores for one message with plain NumPy."""
+    fp = _fast_path
+    idx, vals = fp["count_terms"](user_message)
+    if not len(idx):
+        return fp["intercept"]
+
+    if fp["binary"]:
+        vals[:] = 1.0
+    elif fp["sublinear_tf"]:
+        vals = np.log(vals) + 1.0
+    if fp["idf"] is not None:
+        vals *= fp["idf"][idx]
+    if fp["norm"] == "l2":
+        vals /= np.sqrt(np.dot(vals, vals))
+    elif fp["norm"] == "l1":
+        vals /= np.abs(vals).sum()
+
+    return vals.astype(np.float32) @ fp["coef_by_feature"][idx] + fp["intercept"]
+
+
 def detect_intent(user_message):
     """
     Predict intent label and confidence for a user message using the pre-trained model.
@@ -74,9 +242,71 @@ def detect_intent(user_message):
         Higher confidence scores indicate more certain predictions. Consider using
         a confidence threshold (e.g., 0.7) for decision making in your chatbot logic.
     """
+    # The vectorizer lowercases and tokenizes on word characters, so case and
+    # runs of whitespace do not change the prediction and can share a cache slot.
+    key = " ".join(user_message.lower().split())
+    if len(key) > INTENT_CACHE_MAX_KEY_LENGTH:
+        return _classify(key)
+    return _classify_cached(key)
+
+
+def _classify(user_message):
+    """Run the model on one message, using the fastest available backend."""
+    if _onnx_session is not None:
+        labels, probs = _onnx_session.run(None, {"input": np.array([[user_message]])})
+        best_idx = probs[0].argmax()
+        return labels[0], float(probs[0][best_idx])
+
+    if _fast_path is not None:
+        scores = _fast_scores(user_message)
+        best_idx = int(scores.argmax())
+        # Softmax is monotonic, so the label comes from the raw scores; the
+        # winner's probability is 1 / sum(exp(s_i - s_best)).
+        confidence = float(1.0 / np.exp(scores - scores[best_idx]).sum())
+        return _fast_path["classes"][best_idx], confidence
+
     x_new = vectorizer.transform([user_message])
     probs = clf.predict_proba(x_new)[0]
     best_idx = probs.argmax()
     predicted_intent = clf.classes_[best_idx]
     confidence = probs[best_idx]
     return predicted_intent, confidence
+
+
+# Per-process cache of recent predictions; common phrasings ("Hi", "Thanks!")
+# skip inference entirely. Long messages are rarely repeated and bypass it.
+INTENT_CACHE_SIZE = 4096
+INTENT_CACHE_MAX_KEY_LENGTH = 200
+_classify_cached = functools.lru_cache(maxsize=INTENT_CACHE_SIZE)(_classify)
+
+
+def intent_cache_info():
+    """
+    Return hit/miss statistics for the detect_intent result cache.
+
+    Returns:
+        functools._CacheInfo: (hits, misses, maxsize, currsize) for this process
+    """
+    return _classify_cached.cache_info()
+
+
+def detect_intent_batch(user_messages):
+    """
+    Predict intent labels and confidences for several messages at once.
+
+    The whole batch goes through a single vectorizer.transform and
+    predict_proba call, so per-message overhead is paid once per batch.
+
+    Args:
+        user_messages (list[str]): The user messages to classify
+
+    Returns:
+        list: One (predicted_intent, confidence) tuple per message, in order
+    """
+    if not user_messages:
+        return []
+    x_new = vectorizer.transform(user_messages)
+    probs = clf.predict_proba(x_new)
+    best_idx = probs.argmax(axis=1)
+    confidences = probs[np.arange(len(user_messages)), best_idx]
+    return list(zip(clf.classes_[best_idx], confidences))
@@ -13,12 +13,14 @@ The module handles several intent categories:
 - greeting: Initial user greetings and hellos
 - goodbye: Conversation ending messages
 
-The classifier uses TF-IDF vectorization for feature extraction and is specifically
+The classifier uses hashed TF-IDF features (HashingVectorizer + TfidfTransformer) and is specifically
 trained on healthcare-related conversations, particularly reproductive health scenarios.
 
 Functions:
+    train(): Fit and save the model and vectorizer (run this module as a script)
     load_intent_model(): Load saved model and vectorizer from disk
-    detect_intent(user_message, clf, vectorizer, threshold): Predict intent with confidence
+    detect_intent(user_message, clf=None, vectorizer=None, threshold): Predict intent with confidence
+    detect_intent_batch(messages, clf=None, vectorizer=None): Predict intents for many messages at once
 
 Training Data:
     Contains labeled examples for each intent category, with emphasis on sensitive
@@ -26,12 +28,15 @@ Training Data:
 
 Model Files:
     - intent_classifier.joblib: Trained logistic regression model
-    - intent_vectorizer.joblib: TF-IDF vectorizer for text preprocessing
+    - intent_vectorizer.joblib: HashingVectorizer + TfidfTransformer pipeline for text preprocessing
+    - intent.onnx: Optional ONNX export of the vectorizer + classifier pipeline
+      (written only when the pipeline can be exported; removed otherwise)
 
 Dependencies:
     pandas: Data manipulation and analysis
     sklearn: Machine learning algorithms and utilities
     joblib: Model serialization and loading
+    skl2onnx: Optional, for exporting the trained pipeline to ONNX
 
 Usage:
     # Load trained model
@@ -42,13 +47,23 @@ Usage:
     print(f"Intent: {intent}, Confidence: {confidence:.2f}")
 """
 
-import pandas as pd
-from sklearn.model_selection import train_test_split
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.linear_model import LogisticRegression
-from sklearn.metrics import classification_report
+import functools
+import os
+
 import joblib
 
+# Number of hashed feature columns used by the vectorizer
+HASHING_N_FEATURES = 2 ** 14
+
+# Compression for the saved model files: LZ4 decompresses at close to memory
+# speed when the lz4 package is installed, zlib level 3 otherwise.
+# joblib.load detects the codec, so loading needs no extra arguments.
+try:
+    import lz4  # noqa: F401
+    MODEL_COMPRESSION = ('lz4', 3)
+except ImportError:
+    MODEL_COMPRESSION = 3
+
 # --- 1. Prepare your labeled data ---
 # Example data: replace or expand with your real chat logs!
 data = [
@@ -219,31 +234,112 @@ data = [
     ("Peace out.", "goodbye"),
 ]
 
-df = pd.DataFrame(data, columns=["message", "intent"])
+def train():
+    """
+    Train the intent classifier on the labeled data and save it to disk.
+
+    Fits a TF-IDF vectorizer and a logistic regression classifier, prints a
+    classification report on a held-out split, and writes the model files
+    (plus intent.onnx when it can be exported; otherwise a previous intent.onnx
+    is deleted so it cannot shadow the new model). Training-only dependencies
+    are imported here so loading the model for inference does not need them.
+
+    Returns:
+        tuple: A tuple containing (classifier, vectorizer)
+    """
+    import pandas as pd
+    from sklearn.model_selection import train_test_split
+    from sklearn.feature_extraction.text import HashingVectorizer, TfidfTransformer
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.metrics import classification_report
+    from sklearn.pipeline import make_pipeline
+
+    df = pd.DataFrame(data, columns=["message", "intent"])
+
+    # --- 2. Split into train and test sets ---
+    X_train, X_test, y_train, y_test = train_test_split(
+        df['message'], df['intent'], test_size=0.2, random_state=42, stratify=df['intent']
+    )
+
+    # --- 3. Feature extraction ---
+    # Feature hashing keeps inference free of a Python vocabulary dict; raw
+    # counts from the hasher are IDF-weighted and L2-normalized afterwards.
+    vectorizer = make_pipeline(
+        HashingVectorizer(n_features=HASHING_N_FEATURES, alternate_sign=False, norm=None),
+        TfidfTransformer(),
+    )
+    X_train_vec = vectorizer.fit_transform(X_train)
+    X_test_vec = vectorizer.transform(X_test)
+
+    # --- 4. Train classifier ---
+    clf = LogisticRegression(max_iter=1000)
+    clf.fit(X_train_vec, y_train)
+
+    # --- 5. Evaluate (optional) ---
+    y_pred = clf.predict(X_test_vec)
+    print("Classification Report:\n", classification_report(y_test, y_pred))
+
+    # --- 6. Save model and vectorizer for chatbot use ---
+    joblib.dump(clf, "intent_classifier.joblib", compress=MODEL_COMPRESSION)
+    joblib.dump(vectorizer, "intent_vectorizer.joblib", compress=MODEL_COMPRESSION)
+
+    print("Model and vectorizer saved!\n")
+
+    try:
+        export_onnx(clf, vectorizer)
+        print("ONNX model saved!\n")
+    except ImportError:
+        print("skl2onnx not installed; skipping ONNX export.\n")
+        _remove_stale_onnx()
+    except Exception as e:
+        # skl2onnx has no converter for HashingVectorizer
+        print(f"ONNX export skipped: {e}\n")
+        _remove_stale_onnx()
+
+    return clf, vectorizer
 
-# --- 2. Split into train and test sets ---
-X_train, X_test, y_train, y_test = train_test_split(
-    df['message'], df['intent'], test_size=0.2, random_state=42, stratify=df['intent']
-)
+def _remove_stale_onnx(path="intent.onnx"):
+    """
+    Delete an intent.onnx left over from an earlier model.
 
-# --- 3. Feature extraction ---
-vectorizer = TfidfVectorizer()
-X_train_vec = vectorizer.fit_transform(X_train)
-X_test_vec = vectorizer.transform(X_test)
+    intent_inference prefers the ONNX graph whenever the file exists, so an
+    export that did not happen must not leave the previous one serving
+    predictions for the model that was just replaced.
+    """
+    if os.path.exists(path):
+        os.remove(path)
+        print(f"Removed stale {path}.\n")
 
-# --- 4. Train classifier ---
-clf = LogisticRegression(max_iter=1000)
-clf.fit(X_train_vec, y_train)
+def export_onnx(clf, vectorizer, path="intent.onnx"):
+    """
+    Export the fitted vectorizer + classifier as a single ONNX graph.
 
-# --- 5. Evaluate (optional) ---
-y_pred = clf.predict(X_test_vec)
-print("Classification Report:\n", classification_report(y_test, y_pred))
+    The graph takes a [N, 1] string tensor named "input" and returns the
+    predicted labels and a [N, n_classes] probability matrix, which
+    intent_inference runs through onnxruntime when the file is present.
 
-# --- 6. Save model and vectorizer for chatbot use ---
-joblib.dump(clf, "intent_classifier.joblib")
-joblib.dump(vectorizer, "intent_vectorizer.joblib")
+    Args:
+        clf (LogisticRegression): Trained intent classification model
+        vectorizer (TfidfVectorizer): Fitted TF-IDF vectorizer. skl2onnx cannot
+                                      convert HashingVectorizer, so the hashed
+                                      pipeline from train() is not exportable.
+        path (str, optional): Output file (default: "intent.onnx")
+
+    Raises:
+        ImportError: If skl2onnx is not installed
+    """
+    from skl2onnx import convert_sklearn
+    from skl2onnx.common.data_types import StringTensorType
+    from sklearn.pipeline import Pipeline
 
-print("Model and vectorizer saved!\n")
+    pipeline = Pipeline([("tfidf", vectorizer), ("clf", clf)])
+    onnx_model = convert_sklearn(
+        pipeline,
+        initial_types=[("input", StringTensorType([None, 1]))],
+        options={id(clf): {"zipmap": False}},
+    )
+    with open(path, "wb") as f:
+        f.write(onnx_model.SerializeToString())
 
 # --- 7. Inference Function ---
 
@@ -257,7 +353,7 @@ def load_intent_model():
     Returns:
         tuple: A tuple containing (classifier, vectorizer)
             - classifier (LogisticRegression): Trained intent classification model
-            - vectorizer (TfidfVectorizer): Fitted TF-IDF vectorizer for text preprocessing
+            - vectorizer (Pipeline): Fitted hashing + TF-IDF vectorizer for text preprocessing
             
     Raises:
         FileNotFoundError: If model files are not found in the current directory
@@ -271,7 +367,12 @@ def load_intent_model():
     vectorizer = joblib.load("intent_vectorizer.joblib")
     return clf, vectorizer
 
-def detect_intent(user_message, clf, vectorizer, threshold=0.5):
+@functools.lru_cache(maxsize=1)
+def _get_model():
+    """Load the model and vectorizer once per process."""
+    return load_intent_model()
+
+def detect_intent(user_message, clf=None, vectorizer=None, threshold=0.5):
     """
     Predict the intent of a user message using the trained classification model.
     
@@ -281,8 +382,10 @@ def detect_intent(user_message, clf, vectorizer, threshold=0.5):
     
     Args:
         user_message (str): The user's input message to classify
-        clf (LogisticRegression): Trained intent classification model
-        vectorizer (TfidfVectorizer): Fitted TF-IDF vectorizer for text preprocessing
+        clf (LogisticRegression, optional): Trained intent classification model.
+                                            Loaded from disk once if omitted.
+        vectorizer (Pipeline, optional): Fitted hashing + TF-IDF vectorizer for text
+                                                preprocessing. Loaded from disk once if omitted.
         threshold (float, optional): Minimum confidence threshold (default: 0.5)
                                    Currently not used in implementation but available
                                    for future confidence-based filtering
@@ -305,6 +408,8 @@ def detect_intent(user_message, clf, vectorizer, threshold=0.5):
         of the threshold parameter. Future versions may implement threshold-based
         filtering for low-confidence predictions.
     """
+    if clf is None or vectorizer is None:
+        clf, vectorizer = _get_model()
     x_new = vectorizer.transform([user_message])
     probs = clf.predict_proba(x_new)[0]
     best_idx = probs.argmax()
@@ -312,10 +417,35 @@ def detect_intent(user_message, clf, vectorizer, threshold=0.5):
     confidence = probs[best_idx]
     return predicted_intent, confidence
 
+def detect_intent_batch(messages, clf=None, vectorizer=None):
+    """
+    Predict intents for several messages with one vectorizer and classifier call.
+
+    Args:
+        messages (list[str]): The user messages to classify
+        clf (LogisticRegression, optional): Trained intent classification model.
+                                            Loaded from disk once if omitted.
+        vectorizer (Pipeline, optional): Fitted hashing + TF-IDF vectorizer.
+                                                Loaded from disk once if omitted.
+
+    Returns:
+        list[tuple]: One (predicted_intent, confidence) tuple per message, in order
+    """
+    if not messages:
+        return []
+    if clf is None or vectorizer is None:
+        clf, vectorizer = _get_model()
+    X = vectorizer.transform(messages)
+    probs = clf.predict_proba(X)
+    best = probs.argmax(axis=1)
+    confidences = probs[range(len(messages)), best]
+    return list(zip(clf.classes_[best], confidences))
+
 # --- 8. Example Usage in Chatbot ---
 
 if __name__ == "__main__":
-    # Load model & vectorizer
+    # Train, save, then load model & vectorizer
+    train()
     clf, vectorizer = load_intent_model()
 
     # Test messages
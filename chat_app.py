@@ -1,8 +1,18 @@
+import functools
 import logging
 import os
+import threading
+import time
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import dotenv
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 dotenv.load_dotenv()
 
 POSSIBLE_LOGGING_LEVELS = ['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL']
@@ -22,87 +32,153 @@ else:
 logger = logging.getLogger(__name__)
 
 BASE_URL = "http://localhost:5000/api"
+SUPER_SECRET = os.getenv("SUPER_ADMIN_SECRET", "MYHOPEISJESUS")
+# Seconds to wait on the chat app before giving up; requests has no default timeout
+REQUEST_TIMEOUT = float(os.getenv("CHAT_APP_TIMEOUT", 10))
+
+GENERATE_KEY_URL = f"{BASE_URL}/auth/generate-key"
+ROOMS_URL = f"{BASE_URL}/rooms"
+ROOM_JOIN_URL = BASE_URL + "/rooms/{}/join"
+ROOM_MESSAGES_URL = BASE_URL + "/rooms/{}/messages"
+ADMIN_GENERATE_KEY_URL = f"{BASE_URL}/admin/generate-key"
+PROVISION_USER_URL = f"{BASE_URL}/admin/provision-user"
+
+# One pooled session for every call to the chat app so keep-alive reuses the
+# connection instead of opening a new one per request. Retry's defaults only
+# cover idempotent methods, so POSTs are never sent twice.
+_session = requests.Session()
+_session.headers.update({"Content-Type": "application/json"})
+_adapter = HTTPAdapter(
+    pool_connections=16,
+    pool_maxsize=32,
+    max_retries=Retry(total=3, backoff_factor=0.2, status_forcelist=[502, 503, 504]),
+)
+_session.mount("http://", _adapter)
+_session.mount("https://", _adapter)
+
+
+def _json(response):
+    """Parse a chat app response body, with orjson when it is installed."""
+    if orjson is None:
+        return response.json()
+    return orjson.loads(response.content)
+
+
+@functools.lru_cache(maxsize=1024)
+def _auth_headers(auth_token):
+    """Bearer auth headers for a token, built once per token.
+
+    The returned dict is shared between calls and must not be modified.
+    """
+    return {"Authorization": f"Bearer {auth_token}"}
+
+# room_exist answers are kept for ROOM_EXIST_TTL seconds so routing a message
+# does not list every room on the chat app each time.
+ROOM_EXIST_TTL = 30  # seconds
+ROOM_EXIST_CACHE_SIZE = 4096
+_room_exist_cache = {}  # slug -> (exists, expires)
+_room_exist_lock = threading.Lock()
+# Last GET /rooms listing per token with its ETag, revalidated with If-None-Match
+_rooms_listing = {}  # auth_token -> (etag, rooms)
+
+
+def _cache_room(slug, exists):
+    """Remember whether a room exists for ROOM_EXIST_TTL seconds."""
+    with _room_exist_lock:
+        if len(_room_exist_cache) >= ROOM_EXIST_CACHE_SIZE and slug not in _room_exist_cache:
+            _room_exist_cache.pop(next(iter(_room_exist_cache)))
+        _room_exist_cache[slug] = (exists, time.monotonic() + ROOM_EXIST_TTL)
+
+
+def _cached_room(slug):
+    """Return the cached room_exist answer for slug, or None if absent or stale."""
+    with _room_exist_lock:
+        entry = _room_exist_cache.get(slug)
+        if entry is None:
+            return None
+        if time.monotonic() >= entry[1]:
+            del _room_exist_cache[slug]
+            return None
+        return entry[0]
 
 
 def create_user_token(user_id):
     """Create a user token for authentication."""
-    logger.info(f"Creating token for user {user_id}")
+    logger.info("Creating token for user %s", user_id)
     if not user_id:
         raise ValueError("User ID cannot be empty")
     if not isinstance(user_id, str):
         raise TypeError("User ID must be a string")
     
-    url = f"{BASE_URL}/auth/generate-key"
-    logger.debug(f"Request URL: {url}")
-    logger.debug(f"User ID: {user_id}")
+    url = GENERATE_KEY_URL
+    logger.debug("Request URL: %s", url)
+    logger.debug("User ID: %s", user_id)
     body = {"username": user_id, "expires_in_days": 60}
-    logger.debug(f"Request body: {body}")
+    logger.debug("Request body: %s", body)
     try:
-        response = requests.post(url, json=body)
+        response = _session.post(url, json=body, timeout=REQUEST_TIMEOUT)
         response.raise_for_status()
     except requests.RequestException as e:
-        logger.error(f"Error occurred: {e}")
+        logger.error("Error occurred: %s", e)
         raise
     logger.info("Token created successfully")
-    logger.debug(f"Response: {response}")
+    logger.debug("Response: %s", response)
     if response.status_code == 201:
-        return response.json().get("api_key")
+        return _json(response).get("api_key")
     else:
         raise Exception(f"Failed to create token: {response.text}")
 
 def create_room(user_id, counsellor_id, auth_token):
     "Create chat room for user and counsellor"
-    logger.info(f"Creating chat room for user {user_id} and counsellor {counsellor_id}")
+    logger.info("Creating chat room for user %s and counsellor %s", user_id, counsellor_id)
     if not user_id or not counsellor_id:
         raise ValueError("User ID and Counsellor ID cannot be empty")
-    headers = {
-        "Authorization": f"Bearer {auth_token}",
-        "Content-Type": "application/json"
-    }
-    logger.debug(f"Headers: {headers}")
-    url = f"{BASE_URL}/rooms"
-    logger.debug(f"Request URL: {url}")
-    logger.debug(f"User ID: {user_id}, Counsellor ID: {counsellor_id}")
+    headers = _auth_headers(auth_token)
+    logger.debug("Headers: %s", headers)
+    url = ROOMS_URL
+    logger.debug("Request URL: %s", url)
+    logger.debug("User ID: %s, Counsellor ID: %s", user_id, counsellor_id)
     body = {"slug": f"wa_{user_id}_{counsellor_id}", "is_private": True }
-    logger.debug(f"Request body: {body}")
+    logger.debug("Request body: %s", body)
     try:
-        response = requests.post(url, json=body, headers=headers)
+        response = _session.post(url, json=body, headers=headers, timeout=REQUEST_TIMEOUT)
         response.raise_for_status()
     except requests.RequestException as e:
-        logger.error(f"Error occurred: {e}")
+        logger.error("Error occurred: %s", e)
         raise
     logger.info("Chat room created successfully")
-    logger.debug(f"Response: {response}")
+    logger.debug("Response: %s", response)
     if response.status_code == 201:
-        return response.json().get("slug")
+        slug = _json(response).get("slug")
+        if slug:
+            _cache_room(slug, True)
+        return slug
     else:
         raise Exception(f"Failed to create chat room: {response.text}")
 
 def join_room(user_id, room_slug, auth_token):
     """Join a chat room."""
-    logger.info(f"User {user_id} joining room {room_slug}")
+    logger.info("User %s joining room %s", user_id, room_slug)
     if not user_id or not room_slug:
         raise ValueError("User ID and Room Slug cannot be empty")
     
-    headers = {
-        "Authorization": f"Bearer {auth_token}",
-        "Content-Type": "application/json"
-    }
-    logger.debug(f"Headers: {headers}")
-    url = f"{BASE_URL}/rooms/{room_slug}/join"
-    logger.debug(f"Request URL: {url}")
+    headers = _auth_headers(auth_token)
+    logger.debug("Headers: %s", headers)
+    url = ROOM_JOIN_URL.format(room_slug)
+    logger.debug("Request URL: %s", url)
     
     try:
-        response = requests.post(url, headers=headers)
+        response = _session.post(url, headers=headers, timeout=REQUEST_TIMEOUT)
         response.raise_for_status()
     except requests.RequestException as e:
-        logger.error(f"Error occurred: {e}")
+        logger.error("Error occurred: %s", e)
         raise
     logger.info("User joined room successfully")
-    logger.debug(f"Response: {response}")
+    logger.debug("Response: %s", response)
     
     if response.status_code == 201:
-        return response.json()
+        _cache_room(room_slug, True)
+        return _json(response)
     else:
         raise Exception(f"Failed to join room: {response.text}")
 
@@ -119,16 +195,21 @@ def room_exist(slug, auth_token):
     """
     
     logger.info("Checking if room with slug: %s exists", slug)
+    cached = _cached_room(slug)
+    if cached is not None:
+        logger.debug("Room %s existence served from cache: %s", slug, cached)
+        return cached
     
-    headers = {
-        "Authorization": f"Bearer {auth_token}",
-        "Content-Type": "application/json"
-    }
+    headers = _auth_headers(auth_token)
+    with _room_exist_lock:
+        listing = _rooms_listing.get(auth_token)
+    if listing is not None:
+        headers = {**headers, "If-None-Match": listing[0]}
     logger.debug("Headers: %s", headers)
-    url = f"{BASE_URL}/rooms"
+    url = ROOMS_URL
     logger.debug("Request URL: %s", url)
     try:
-        response = requests.get(url, headers=headers)
+        response = _session.get(url, headers=headers, timeout=REQUEST_TIMEOUT)
         response.raise_for_status()
     except requests.RequestException as e:
         logger.error("An Error occured: %s", e)
@@ -137,54 +218,62 @@ def room_exist(slug, auth_token):
     logger.info("Rooms retrieved succesfully with response from chat app")
     logger.debug("Response: %s", response)
     
-    if response.status_code == 200:
-        rooms_dict = response.json()
-        rooms = [room['slug'] for room in rooms_dict['rooms']]
-        logger.debug("Room slugs: %s", rooms)
-        return slug in rooms
+    if response.status_code == 304 and listing is not None:
+        logger.debug("Rooms listing not modified, reusing cached copy")
+        rooms = listing[1]
+    elif response.status_code == 200:
+        rooms = _json(response)['rooms']
+        etag = response.headers.get("ETag")
+        if etag:
+            with _room_exist_lock:
+                if len(_rooms_listing) >= ROOM_EXIST_CACHE_SIZE and auth_token not in _rooms_listing:
+                    _rooms_listing.pop(next(iter(_rooms_listing)))
+                _rooms_listing[auth_token] = (etag, rooms)
+    else:
+        rooms = None
+    if rooms is not None:
+        exists = any(room['slug'] == slug for room in rooms)
+        logger.debug("Room %s found among %d rooms: %s", slug, len(rooms), exists)
+        _cache_room(slug, exists)
+        return exists
     else:
         raise Exception(f"failed to check if room exists")
     
     
 def send_message(room_slug, message, auth_token):
     """Send a message to a chat room."""
-    logger.info(f"Sending message to room {room_slug}")
+    logger.info("Sending message to room %s", room_slug)
     if not room_slug or not message:
         raise ValueError("Room Slug and Message cannot be empty")
     
-    headers = {
-        "Authorization": f"Bearer {auth_token}",
-        "Content-Type": "application/json"
-    }
-    logger.debug(f"Headers: {headers}")
-    url = f"{BASE_URL}/rooms/{room_slug}/messages"
-    logger.debug(f"Request URL: {url}")
+    headers = _auth_headers(auth_token)
+    logger.debug("Headers: %s", headers)
+    url = ROOM_MESSAGES_URL.format(room_slug)
+    logger.debug("Request URL: %s", url)
     
     body = {"text": message}
-    logger.debug(f"Request body: {body}")
+    logger.debug("Request body: %s", body)
     
     try:
-        response = requests.post(url, json=body, headers=headers)
+        response = _session.post(url, json=body, headers=headers, timeout=REQUEST_TIMEOUT)
         response.raise_for_status()
     except requests.RequestException as e:
-        logger.error(f"Error occurred: {e}")
+        logger.error("Error occurred: %s", e)
         raise
     logger.info("Message sent successfully")
-    logger.debug(f"Response: {response}")
+    logger.debug("Response: %s", response)
     
     if response.status_code == 201:
-        return response.json()
+        return _json(response)
     else:
         raise Exception(f"Failed to send message: {response.text}")
     
 def generate_admin_key():
     """Generates an admin key for the chat app"""
     logger.info("Generating admin key")
-    SUPER_SECRET  = os.getenv("SUPER_ADMIN_SECRET", "MYHOPEISJESUS")
-    url = f"{BASE_URL}/admin/generate-key"
-    logger.debug(f"Request URL: {url}")
+    url = ADMIN_GENERATE_KEY_URL
+    logger.debug("Request URL: %s", url)
     headers = {
-        "Content-Type": "application/json",
         "X-Super-Admin-Secret": SUPER_SECRET
     }
     json = {
@@ -193,17 +282,17 @@ def generate_admin_key():
     }
     
     try:
-        response = requests.post(url, json=json, headers=headers)
+        response = _session.post(url, json=json, headers=headers, timeout=REQUEST_TIMEOUT)
         response.raise_for_status()
     except requests.RequestException as e:
-        logger.error(f"Error occurred: {e}")
+        logger.error("Error occurred: %s", e)
         raise
     
     logger.info("Admin key generated successfully")
-    logger.debug(f"Response: {response}")
+    logger.debug("Response: %s", response)
     
     if response.status_code == 200:
-        return response.json().get("api_key")
+        return _json(response).get("api_key")
     else:
         raise Exception(f"Failed to generate admin key: {response.text}")
     
@@ -218,32 +307,31 @@ def provision_counsellor_account(username, email, admin_key):
     Returns:
         str: The magic link for the counsellor account.
     """
-    logger.info(f"Provisioning counsellor account for {username}")
+    logger.info("Provisioning counsellor account for %s", username)
     if not username or not email:
         raise ValueError("Username and Email cannot be empty")
     
     headers = {
-        "X-Admin-API-Key": admin_key,
-        "Content-Type": "application/json"
+        "X-Admin-API-Key": admin_key
     }
-    logger.debug(f"Headers: {headers}")
-    url = f"{BASE_URL}/admin/provision-user"
-    logger.debug(f"Request URL: {url}")
+    logger.debug("Headers: %s", headers)
+    url = PROVISION_USER_URL
+    logger.debug("Request URL: %s", url)
     
     body = {"username": username, "email": email}
-    logger.debug(f"Request body: {body}")
+    logger.debug("Request body: %s", body)
     
     try:
-        response = requests.post(url, json=body, headers=headers)
+        response = _session.post(url, json=body, headers=headers, timeout=REQUEST_TIMEOUT)
         response.raise_for_status()
     except requests.RequestException as e:
-        logger.error(f"Error occurred: {e}")
+        logger.error("Error occurred: %s", e)
         return f'Error: {e}'
     
     logger.info("Counsellor account provisioned successfully")
-    logger.debug(f"Response: {response}")
+    logger.debug("Response: %s", response)
     
     if response.status_code == 200:
-        return response.json().get("magic_link")
+        return _json(response).get("magic_link")
     else:
         return None
\ No newline at end of file
@@ -1,6 +1,14 @@
 import os
+import atexit
 import logging
+import queue
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from enum import IntEnum
+from types import MappingProxyType
 import database.db as db
 import transcript
 import users
@@ -19,6 +27,11 @@ import data_extractor
 
 dotenv.load_dotenv()
 
+# langdetect loads its language profiles on first use; do it now rather than
+# on the first user's language selection. (The intent model, embeddings and
+# LLM client are already built when ai_bot is imported.)
+detect_language("warm up the language profiles")
+
 #incoming message are dictionaries
 #Not all the incoming messages have the same structure
 
@@ -75,406 +88,715 @@ Veuillez répondre avec vos réponses, une par message :
 
 *Prêt(e) ? Envoyez d'abord votre âge.*"""
 
-MODE = os.getenv('MODE')
-print(f"MODE: {MODE}")
+# User-facing texts per language; anything other than 'fr' falls back to English
+LOCALE = MappingProxyType({
+    'en': MappingProxyType({
+        'greeting': GREEETINGS_EN,
+        'completion': "Your information is safe and confidential. How can we help you?",
+        'escalation': "Due to the sensitive nature of your message, you have been connected to a counsellor. "
+                      "A counsellor has been assigned to you and will be with you shortly.",
+    }),
+    'fr': MappingProxyType({
+        'greeting': GREETINGS_FR,
+        'completion': "Vos informations sont sûres et confidentielles. Comment pouvons-nous vous aider ?",
+        'escalation': "En raison de la nature sensible de votre message, vous avez été mis(e) en relation avec un conseiller. "
+                      "Un conseiller vous a été attribué et sera avec vous sous peu.",
+    }),
+})
+
+# Whapi-compatible language selection buttons, sent to every first-time user.
+# router only reads these keys into a new payload; the nested values stay
+# plain dicts so they serialize as JSON.
+LANGUAGE_OPTIONS = MappingProxyType({
+    'body': {'text': LANGUAGE_SELECTION_PROMPT},
+    'action': {
+        'buttons': [
+            {
+                'type': 'quick_reply',
+                'title': 'English 🇬🇧',
+                'id': 'lang_en'
+            },
+            {
+                'type': 'quick_reply',
+                'title': 'Français 🇫🇷',
+                'id': 'lang_fr'
+            }
+        ]
+    },
+    'type': 'button'
+})
+
+class Mode(IntEnum):
+    """Deployment modes, named after the accepted values of the MODE env var."""
+    NO_COUNSELLOR = 0
+    SINGLE_COUNSELLOR = 1
+    MULTI_COUNSELLORS_WP = 2
+    MULTI_COUNSELLORS_WP_WEB = 3
+
+_mode_name = os.getenv('MODE')
 POSSIBLE_LOGGING_LEVELS = ['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL']
-if MODE not in ["no_counsellor", "single_counsellor", "multi_counsellors_wp", "multi_counsellors_wp_web"]:
+if _mode_name not in ["no_counsellor", "single_counsellor", "multi_counsellors_wp", "multi_counsellors_wp_web"]:
     print("Invalid MODE. Please set MODE to 'no_counsellor', 'single_counsellor', or 'multi_counsellor'.")
     exit(1)
-if os.getenv('LOGGING_LEVEL').upper() not in POSSIBLE_LOGGING_LEVELS:
+# Parsed once here so the per-message checks compare ints, not strings
+MODE = Mode[_mode_name.upper()]
+DEFAULT_ROUTE = os.getenv('DEFAULT_ROUTE', 'test_route')
+logging_level = os.getenv('LOGGING_LEVEL', 'INFO').upper()
+if logging_level not in POSSIBLE_LOGGING_LEVELS:
     print(f"Invalid LOGGING_LEVEL. Please set LOGGING_LEVEL to one of {POSSIBLE_LOGGING_LEVELS}.")
     exit(1)
-logging_level = os.getenv('LOGGING_LEVEL', 'INFO').upper()
 logging_file = os.getenv('LOGGING_FILE', 'chat_bot_log.log')
 logging_format = '%(asctime)s - %(levelname)s - %(message)s'
-if logging_file:
-    logging.basicConfig(filename=logging_file, level=getattr(logging, logging_level, logging.INFO), format=logging_format)
-else:
-    logging.basicConfig(level=getattr(logging, logging_level, logging.INFO), format=logging_format)
-
-def incoming_messages(user, message, reciever_id=None):
+# An empty LOGGING_FILE logs to stderr (basicConfig treats filename=None that way)
+logging.basicConfig(filename=logging_file or None, level=getattr(logging, logging_level), format=logging_format)
+logger = logging.getLogger(__name__)
+logger.info("MODE: %s", _mode_name)
+
+# Map onboarding question keys to database fields
+FIELD_MAPPING = MappingProxyType({
+    'age': 'age',
+    'gender': 'gender',
+    'children': 'number_of_children',
+    'location': 'location',
+    'disabilities': 'disability',
+    'arv_medication': 'arv',
+    'displaced': 'internally_displaced',
+    'occupation': 'occupation',
+    'last_menstrual_period': 'last_menstrual_flow',
+    'marital_status': 'marital_status',
+    'religious_background': 'religious_background'
+})
+
+# Answers that mean the user skipped the question (compared lowercased)
+SKIP_VALUES = frozenset({'skip', 'passer', 'prefer not to say', 'préfère ne pas dire'})
+
+# Typed language choices, matched in one pass over the casefolded reply; the
+# group name is the language code. A language name counts as a whole word
+# anywhere in the reply, a bare code only when it is the whole reply ("en"
+# is also a French word: "en français").
+LANGUAGE_CHOICE_SEARCH = re.compile(r"\b(?P<fr>français|francais)\b|^(?P<fr_code>fr)$|"
+                                    r"\b(?P<en>english|anglais)\b|^(?P<en_code>en)$").search
+
+def _match_lang(text):
+    """Return 'en' or 'fr' if text names a language, else None."""
+    choice = LANGUAGE_CHOICE_SEARCH(text)
+    if choice is None:
+        return None
+    return choice.lastgroup[:2]
+
+# Onboarding questions, read once instead of on every onboarding message;
+# get_questions() picks up edits to the file by its modification time
+QUESTIONS_FILE = "user_data.json"
+
+def _questions_mtime():
+    try:
+        return os.stat(QUESTIONS_FILE).st_mtime
+    except OSError:
+        return None
+
+def _question_plan(questions):
+    """Map each question (None before the first) to the one asked after it."""
+    order = tuple(questions or ())
+    return dict(zip((None,) + order, order + ('Done',)))
+
+_questions_loaded_mtime = _questions_mtime()
+_questions = data_extractor.load_question_list(QUESTIONS_FILE)
+# (questions, plan), replaced as one object so the lanes never read the
+# questions of one version of the file with the plan of another
+_question_state = (_questions, _question_plan(_questions))
+
+def get_questions():
+    """Return (questions, plan) for onboarding, reloading both if the file changed."""
+    global _question_state, _questions_loaded_mtime
+    mtime = _questions_mtime()
+    if mtime is not None and mtime != _questions_loaded_mtime:
+        questions = data_extractor.load_question_list(QUESTIONS_FILE)
+        if questions is not None:
+            logger.info("Reloaded onboarding questions from %s", QUESTIONS_FILE)
+            _question_state = (questions, _question_plan(questions))
+            _questions_loaded_mtime = mtime
+    return _question_state
+
+def next_question_after(current_question):
+    """The question to ask after current_question (None for the first), or 'Done'.
+
+    Returns:
+        tuple: (questions, next question), both from the same version of the file.
+    """
+    questions, plan = get_questions()
+    next_question = plan.get(current_question)
+    if next_question is None:
+        # The question was removed from the file while the user was answering it
+        logger.warning("Onboarding question %s no longer exists; finishing onboarding", current_question)
+        next_question = 'Done'
+    return questions, next_question
+
+# Worker threads for chat app calls that can run alongside other work
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="chat_handler")
+
+# Single-thread lanes for work that may leave the request thread but must stay
+# in order per user: a user's work always lands on the same lane. Incoming
+# messages are handled here (LLM and HTTP calls included), so this also caps
+# how many users are being answered at once.
+# The ordering only holds within one process: with several gunicorn workers,
+# two webhooks for the same user can reach different workers and run
+# concurrently. Lanes are also shared, so one slow LLM call delays every
+# user hashed to the same lane until it returns.
+USER_LANES = int(os.getenv('USER_LANES', 16))
+_user_lanes = [ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"user_lane_{i}")
+               for i in range(USER_LANES)]
+
+def _log_lane_failure(future):
+    error = future.exception()
+    if error is not None:
+        logger.error("Background work failed: %s", error, exc_info=error)
+
+def submit_for_user(user, fn, *args):
+    """Run fn(*args) in the background, after any work already submitted for user."""
+    future = _user_lanes[hash(user) % USER_LANES].submit(fn, *args)
+    future.add_done_callback(_log_lane_failure)
+    return future
+
+# Conversation writes are queued and saved by a background thread in batches,
+# so sending a reply doesn't wait on the database.
+MEMORY_BATCH_SIZE = int(os.getenv('MEMORY_BATCH_SIZE', 50))
+MEMORY_FLUSH_INTERVAL = int(os.getenv('MEMORY_BATCH_MS', 100)) / 1000  # seconds
+_memory_queue = queue.Queue()  # (row, parties) items
+# Rows queued but not yet written, per party, so a reader waits only for its own
+_pending_writes = {}
+_pending_cond = threading.Condition()
+
+def _memory_writer():
+    """Drain the memory queue into the database, one executemany per batch."""
+    while True:
+        batch = [_memory_queue.get()]
+        # A batch is written at most MEMORY_FLUSH_INTERVAL after its first row
+        deadline = time.monotonic() + MEMORY_FLUSH_INTERVAL
+        try:
+            while len(batch) < MEMORY_BATCH_SIZE:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                batch.append(_memory_queue.get(timeout=remaining))
+        except queue.Empty:
+            pass
+        try:
+            if db.save_memory_rows([row for row, _ in batch]):
+                logger.debug("Saved %d queued messages", len(batch))
+            else:
+                logger.error("Failed to save %d queued messages", len(batch))
+        except Exception as e:
+            # Never let the writer die: flush_memory would wait forever
+            logger.error("Error saving %d queued messages: %s", len(batch), e)
+        finally:
+            _writes_done(batch)
+
+def _writes_done(batch):
+    with _pending_cond:
+        for _, parties in batch:
+            for party in parties:
+                left = _pending_writes[party] - 1
+                if left:
+                    _pending_writes[party] = left
+                else:
+                    del _pending_writes[party]
+        _pending_cond.notify_all()
+
+def flush_memory(user=None):
+    """Block until user's queued conversation messages (or everyone's) are written."""
+    with _pending_cond:
+        if user is None:
+            _pending_cond.wait_for(lambda: not _pending_writes)
+        else:
+            _pending_cond.wait_for(lambda: user not in _pending_writes)
+
+# How many recent turns are read for the LLM history; prepare_history_for_llm
+# keeps the last few verbatim and summarizes the rest
+HISTORY_MAX_TURNS = 40
+
+threading.Thread(target=_memory_writer, name="memory_writer", daemon=True).start()
+atexit.register(flush_memory)
+
+# Messages waiting for their user's lane. A burst of texts that arrives while
+# the previous reply is still being generated is answered as one message; each
+# text is still saved to the conversation on its own.
+_pending_messages = {}  # user -> [(message, reciever_id), ...]
+_pending_lock = threading.Lock()
+
+def enqueue_incoming_message(user, message, reciever_id=None):
+    """Handle the message on the user's lane and return without waiting for it."""
+    with _pending_lock:
+        queued = _pending_messages.get(user)
+        if queued is not None:
+            # A drain is already scheduled and hasn't started; it will pick this up
+            queued.append((message, reciever_id))
+            return
+        _pending_messages[user] = [(message, reciever_id)]
+    submit_for_user(user, _drain_incoming_messages, user)
+
+def _is_plain_text(message, reciever_id):
+    # Raw Whapi text messages carry chat_id; the button replies index.py
+    # rebuilds as text don't, and chat app messages come with a receiver
+    return (reciever_id is None and isinstance(message, dict)
+            and message.get('type') == 'text' and 'chat_id' in message)
+
+def _merge_text_messages(messages):
+    """One text message whose body is the bodies of messages, in order."""
+    merged = dict(messages[-1])
+    merged['text'] = dict(merged['text'], body="\n".join(m['text'].get('body', '') for m in messages))
+    return merged
+
+def _drain_incoming_messages(user):
+    with _pending_lock:
+        queued = _pending_messages.pop(user)
+    if len(queued) > 1 and not is_counsellor(user):
+        user_profile = get_user_profile(user)
+        # Only AI conversations are merged; onboarding answers and messages
+        # forwarded to a counsellor must each arrive on their own
+        merge = user_profile is not None and user_profile['handler'] == "ai_bot"
+    else:
+        merge = False
+    burst = []
+    for message, reciever_id in queued:
+        if merge and _is_plain_text(message, reciever_id):
+            burst.append(message)
+            continue
+        _handle_burst(user, burst)
+        burst = []
+        _handle_queued_message(user, message, reciever_id)
+    _handle_burst(user, burst)
+
+def _handle_burst(user, burst):
+    if len(burst) > 1:
+        logger.info("Answering %d queued messages from %s together", len(burst), user)
+        _handle_queued_message(user, _merge_text_messages(burst), parts=burst)
+    elif burst:
+        _handle_queued_message(user, burst[0])
+
+def _handle_queued_message(user, message, reciever_id=None, parts=None):
+    # One failing message mustn't drop the rest of the queue
+    try:
+        incoming_messages(user, message, reciever_id, parts)
+    except Exception:
+        logger.exception("Failed to handle message from %s", user)
+
+def incoming_messages(user, message, reciever_id=None, parts=None):
     """Handle incoming messages from users or counsellors.
 
     Args:
         user (str): The user ID.
         message (dict): The incoming message dictionary.
+        parts (list, optional): The original messages when message merges a
+            burst; these are saved to the conversation instead of message.
     """
-    logging.info("Handling incoming message")
-    logging.debug("Message from: %s, Message: %s", user, message)
-    #if MODE == "no_counsellor":
-    if not is_counsellor(user):
-        logging.debug('mode: %s', MODE)
-        logging.debug('User: %s, Message: %s', user, message)
-        logging.debug("Checking if message is from a first-time user...")
-        if first_time_user(user):
-            logging.info("First time user detected: %s", user)
-            register_user(user)
-            logging.info("User %s registered successfully.", user)
-            save_conversation(user, message)
-            logging.debug("Changing user %s handler to on-boarder", user)
-            if users.update_user_handler(user, "on-boarder"):
-                logging.info("User %s handler changed to on-boarder successfully.", user)
-            # Send language selection buttons
-            send_language_selection(user)
-            return
-        logging.info("Saving conversation for user: %s", user)
-        save_conversation(user, message)
-        user_profile = get_user_profile(user)
-        if user_profile and user_profile['handler'] == "on-boarder":
-            # Check if language has been set
-            user_language = user_profile.get('language')
-
-            if not user_language:
-                # This is the language selection response
-                logging.info("Processing language selection for user: %s", user)
-                msg_data = get_chat_data(message)
-                user_input = msg_data.get('body', '').lower().strip()
-
-                # Check for button response (has 'button_id' field in button replies)
-                selected_language = 'en'  # Default
-
-                # Try to parse button ID (format: lang_en or lang_fr)
-                if 'button_id' in msg_data and msg_data['button_id'].startswith('lang_'):
-                    selected_language = msg_data['button_id'].split('_')[1]
-                    logging.info("Language selected via button: %s", selected_language)
-                # Check text response
-                elif 'français' in user_input or 'francais' in user_input or user_input == 'fr':
-                    selected_language = 'fr'
-                    logging.info("Language selected via text (French): %s", user_input)
-                elif 'english' in user_input or user_input == 'en':
-                    selected_language = 'en'
-                    logging.info("Language selected via text (English): %s", user_input)
-                else:
-                    # Try to detect from message
-                    selected_language = detect_language(user_input, default='en')
-                    logging.info("Language detected from message: %s", selected_language)
-
-                # Store selected language
-                users.update_user(user, "language", selected_language)
-                logging.info("Stored language preference for user %s: %s", user, selected_language)
-
-                # Send welcome message in selected language
-                if selected_language == 'fr':
-                    send_message(user, GREETINGS_FR)
-                else:
-                    send_message(user, GREEETINGS_EN)
+    logger.info("Handling incoming message")
+    logger.debug("Message from: %s, Message: %s", user, message)
+    # Parsed once; every branch below reads the body/button id from here
+    msg_data = get_chat_data(message)
+    if is_counsellor(user):
+        _handle_counsellor_message(user, msg_data, reciever_id)
+    else:
+        _handle_user_message(user, message, msg_data, parts)
+
+def _handle_counsellor_message(user, msg_data, reciever_id):
+    """Relay a counsellor's message to the user it is addressed to."""
+    msg = msg_data['body']
+    send_message(user, msg, reciever_id)
+
+def _handle_user_message(user, message, msg_data, parts=None):
+    """Onboard, forward or answer a message from a (non-counsellor) user."""
+    logger.debug('mode: %s', MODE.name)
+    logger.debug('User: %s, Message: %s', user, message)
+    logger.debug("Checking if message is from a first-time user...")
+    # One profile lookup serves both the first-time check and the routing below
+    user_profile = get_user_profile(user)
+    if user_profile is None:
+        logger.info("First time user detected: %s", user)
+        # Send language selection buttons while the user is being registered;
+        # the send doesn't depend on the user's row
+        selection = _executor.submit(send_language_selection, user)
+        # Created straight into onboarding: one INSERT, no follow-up handler UPDATE
+        register_user(user, handler="on-boarder")
+        for part in parts or (message,):
+            save_conversation(user, part)
+        selection.result()
+        return
+    logger.info("Saving conversation for user: %s", user)
+    # A merged burst is stored as the messages that actually arrived
+    for part in parts or (message,):
+        save_conversation(user, part)
+    handler_impl = _HANDLER_IMPL.get(user_profile['handler'])
+    if handler_impl is not None and handler_impl(user, user_profile, msg_data):
+        return
+    _reply_with_ai(user, user_profile, msg_data)
 
-                # Initialize onboarding - set first question
-                questions_obj = data_extractor.load_question_list("user_data.json")
-                first_question = data_extractor.set_next_question(questions_obj, None)
-                users.update_user(user, "onboarding_level", first_question)
-                logging.info("Initialized onboarding for user %s with first question: %s", user, first_question)
+def _handle_onboarding(user, user_profile, msg_data):
+    """Take a language choice or onboarding answer; True if nothing is left to do."""
+    # Check if language has been set
+    user_language = user_profile.get('language')
 
-                return
+    if not user_language:
+        # This is the language selection response
+        logger.info("Processing language selection for user: %s", user)
+        user_input = msg_data.get('body', '').strip().casefold()
 
-            # Language is set, proceed with onboarding questions
-            current_question = user_profile['onboarding_level']
-
-            # If there's a current question, this message is the answer to it
-            if current_question:
-                msg_data = get_chat_data(message)
-                user_answer = msg_data.get('body', '').strip()
-
-                # Save the answer to the appropriate field
-                logging.info("Saving answer for question '%s' from user %s: %s", current_question, user, user_answer)
-
-                # Map question keys to database fields
-                field_mapping = {
-                    'age': 'age',
-                    'gender': 'gender',
-                    'children': 'number_of_children',
-                    'location': 'location',
-                    'disabilities': 'disability',
-                    'arv_medication': 'arv',
-                    'displaced': 'internally_displaced',
-                    'occupation': 'occupation',
-                    'last_menstrual_period': 'last_menstrual_flow',
-                    'marital_status': 'marital_status',
-                    'religious_background': 'religious_background'
-                }
-
-                db_field = field_mapping.get(current_question)
-                if db_field:
-                    # Don't save if user skipped or preferred not to say
-                    skip_values = ['skip', 'passer', 'prefer not to say', 'préfère ne pas dire']
-                    if user_answer.lower() not in skip_values:
-                        users.update_user(user, db_field, user_answer)
-                        logging.info("Saved %s = %s for user %s", db_field, user_answer, user)
-                    else:
-                        logging.info("User %s skipped question: %s", user, current_question)
-
-            # Send next question
-            questions_obj = data_extractor.load_question_list("user_data.json")
-            next_question = data_extractor.set_next_question(questions_obj, current_question)
-
-            if next_question == 'Done':
-                logging.info("Onboarding complete for user: %s", user)
-                users.update_user_handler(user, "ai_bot")
-                # Send completion message in user's language
-                completion_msg = {
-                    'en': "Your information is safe and confidential. How can we help you?",
-                    'fr': "Vos informations sont sûres et confidentielles. Comment pouvons-nous vous aider ?"
-                }
-                send_message(user, completion_msg.get(user_language, completion_msg['en']))
-                return
+        # Check for button response (has 'button_id' field in button replies)
+        selected_language = 'en'  # Default
 
-            # Update to next question and send it
-            users.update_user(user, "onboarding_level", next_question)
-            logging.debug("Updated onboarding level to: %s for user: %s", next_question, user)
-
-            question, options = data_extractor.message_builder(questions_obj, next_question, user_language)
-            data_extractor.send_question(user, question, options)
-                
-                
-        if user_profile and user_profile['handler'] == "counsellor":
-            if MODE == "no_counsellor":
-                logging.info("User %s is assigned to a counsellor, skipping AI response", user)
-                return
-            elif MODE == "single_counsellor":
-                pass
-            elif MODE == "multi_counsellors_wp":
-                pass
-            elif MODE == "multi_counsellors_wp_web":
-                logging.info("Handling multi-counsellor mode")
-                # In this mode, we might want to route the message to a specific counsellor
-                handler_agent = get_handler_agent(user)
-                room_slug = f'wa_{user}_{handler_agent}'
-                auth_token = users.get_user_profile(user)['auth_key']
-                if auth_token is None:
-                    logging.info("Auth token not found for user %s, generating a new one", user)
-                    try:
-                        fresh_token = chat_app.create_user_token(user)  
-                    except Exception as e:
-                        logging.error("Failed to create user token for user %s: %s", user, e)
-                        return
-                    users.update_user(user, "auth_key", fresh_token)
-                    auth_token = users.get_user_profile(user)['auth_key']
-                #checking if room exist
-                #if chat_app.room_exist(room_slug, auth_token):
-                msg_body = get_chat_data(message)['body']
-                response = chat_app.send_message(room_slug, msg_body, auth_token)
-                if response.get("error"):
-                    logging.error("Failed to send message to room %s: %s", room_slug, response['error'])
-                return
-                #else:
-                    #logging.warn("No room exist to send message")
-            else:   
-                print("Invalid MODE. Please set MODE to 'no_counsellor', 'single_counsellor', or 'multi_counsellor'.")
-                return
-        user_message = get_chat_data(message)['body']
-        ai_response = get_ai_response(user, user_message, user_profile['language'])
-        if ai_response is None:
-            pass
-        if ai_response == "Escalating to a counsellor...":
-            #user_transcript = get_transcript(user)
-            escalate_to_counsellor(user)
-            notify_user_counsellor_assigned(user, user_profile['language'])
-            send_message(user, "Due to the sensitive nature of your message, you have been connected to a counsellor. They will be with you shortly.")
+        # Try to parse button ID (format: lang_en or lang_fr)
+        if 'button_id' in msg_data and msg_data['button_id'].startswith('lang_'):
+            selected_language = msg_data['button_id'].split('_')[1]
+            logger.info("Language selected via button: %s", selected_language)
         else:
-            print(f"AI response to {user}: {ai_response}")
-            send_message(user, ai_response)
-            #save_conversation("ai_bot", ai_response)
+            # Check text response
+            choice = _match_lang(user_input)
+            if choice:
+                selected_language = choice
+                logger.info("Language selected via text (%s): %s", selected_language, user_input)
+            else:
+                # Try to detect from message
+                selected_language = detect_language(user_input, default='en')
+                logger.info("Language detected from message: %s", selected_language)
+
+        # Store selected language and initialize onboarding - set first question
+        _, first_question = next_question_after(None)
+        users.update_user_fields(user, {"language": selected_language, "onboarding_level": first_question})
+        logger.info("Stored language preference for user %s: %s", user, selected_language)
+        logger.info("Initialized onboarding for user %s with first question: %s", user, first_question)
+
+        # Send welcome message in selected language
+        send_message(user, LOCALE.get(selected_language, LOCALE['en'])['greeting'])
+
+        return True
+
+    # Language is set, proceed with onboarding questions
+    current_question = user_profile['onboarding_level']
+
+    # The answer and the next step are written together below
+    updates = {}
+
+    # If there's a current question, this message is the answer to it
+    if current_question:
+        user_answer = msg_data.get('body', '').strip()
+
+        # Save the answer to the appropriate field
+        logger.info("Saving answer for question '%s' from user %s: %s", current_question, user, user_answer)
+
+        db_field = FIELD_MAPPING.get(current_question)
+        if db_field:
+            # Don't save if user skipped or preferred not to say
+            if user_answer.casefold() not in SKIP_VALUES:
+                updates[db_field] = user_answer
+                logger.info("Saving %s = %s for user %s", db_field, user_answer, user)
+            else:
+                logger.info("User %s skipped question: %s", user, current_question)
+
+    # Send next question
+    questions, next_question = next_question_after(current_question)
+
+    if next_question == 'Done':
+        logger.info("Onboarding complete for user: %s", user)
+        updates["handler"] = "ai_bot"
+        users.update_user_fields(user, updates)
+        # Send completion message in user's language
+        send_message(user, LOCALE.get(user_language, LOCALE['en'])['completion'])
+        return True
+
+    # Update to next question and send it
+    updates["onboarding_level"] = next_question
+    users.update_user_fields(user, updates)
+    logger.debug("Updated onboarding level to: %s for user: %s", next_question, user)
+
+    question, options = data_extractor.message_builder(questions, next_question, user_language)
+    data_extractor.send_question(user, question, options)
+
+    # Not fully handled: the AI answers this message as well
+    return False
+
+def _handle_counsellor(user, user_profile, msg_data):
+    """Pass the message on per MODE; True if the AI shouldn't answer it."""
+    counsellor_impl = _COUNSELLOR_IMPL.get(MODE)
+    if counsellor_impl is None:
+        # single_counsellor / multi_counsellors_wp: the AI keeps answering
+        return False
+    counsellor_impl(user, user_profile, msg_data)
+    return True
+
+def _reply_with_ai(user, user_profile, msg_data):
+    """Answer the message with the AI, escalating to a counsellor when it asks to."""
+    user_message = msg_data['body']
+    ai_response = get_ai_response(user, user_message, user_profile['language'])
+    if ai_response is None:
+        pass
+    if ai_response == "Escalating to a counsellor...":
+        #user_transcript = get_transcript(user)
+        escalate_to_counsellor(user)
+        # One localized message covers both the reason and the assignment
+        notify_user_counsellor_assigned(user, user_profile['language'])
     else:
-        msg = get_chat_data(message)['body']
-        send_message(user, msg, reciever_id)
-        
+        logger.debug("AI response to %s: %s", user, ai_response)
+        send_message(user, ai_response)
+        #save_conversation("ai_bot", ai_response)
 
-def is_counsellor(user):
-    logging.info("Checking if user: %s is a councellor", user)
-    return user in counsellors.get_counsellors()
+# What each user handler does with a message before (or instead of) the AI
+# reply; "ai_bot" and anything unknown go straight to _reply_with_ai
+_HANDLER_IMPL = {
+    "on-boarder": _handle_onboarding,
+    "counsellor": _handle_counsellor,
+}
 
-def first_time_user(user):
-    logging.info("Checking if user is in the database")
-    return not db.user_exist(user)
+def is_counsellor(user):
+    logger.info("Checking if user: %s is a councellor", user)
+    return counsellors.is_counsellor(user)
 
-def register_user(user):
-    logging.info("saving user: %s", user)
-    status = db.save_user(user)
+def register_user(user, handler="ai_bot"):
+    logger.info("saving user: %s", user)
+    status = db.save_user(user, handler)
     if status:
-        logging.info("User: %s, saved sucesfully", user)
+        logger.info("User: %s, saved sucesfully with handler: %s", user, handler)
     else:
-        logging.error("Failed to save user: %s", user)
+        logger.error("Failed to save user: %s", user)
 
 def get_handler_agent(user):
-    logging.info("Getting handler for a ticket")
+    logger.info("Getting handler for a ticket")
     ticket_owner = user
     ticket_id = f'00T{ticket_owner}'
-    logging.debug("Ticket_id: %s, User: %s", ticket_id, ticket_owner)
+    logger.debug("Ticket_id: %s, User: %s", ticket_id, ticket_owner)
     user_ticket = db.get_ticket(ticket_id)
-    logging.debug("Ticket: %s", user_ticket)
+    logger.debug("Ticket: %s", user_ticket)
     if user_ticket:
         handler_id = user_ticket['handler']  # Assuming handler is the 4th field in the ticket tuple
         return handler_id
     return None
 
 def get_user_profile(user):
-    logging.info("Getting user info")
-    user_profile = db.get_user_profile(user)
-    logging.debug("User profile: %s", user_profile)
-    # Convert sqlite3.Row to dict for easier access
-    if user_profile:
-        return dict(user_profile)
+    logger.info("Getting user info")
+    # Cached briefly (live while onboarding); users.update_* drop the entry whenever the profile changes
+    user_profile = users.get_user_profile_cached(user)
+    logger.debug("User profile: %s", user_profile)
     return user_profile
 
 def get_ai_response(user, message, language):
-    logging.info("Getting message from db")
-    memories = db.get_memory(user)
-    logging.debug("User messages: %s", memories )
+    # History must include this user's queued messages (not everyone's)
+    flush_memory(user)
+    # Read from the database every time: other workers save turns for this user too
+    logger.info("Getting message from db")
+    memories = db.get_memory(user, limit=HISTORY_MAX_TURNS)
+    logger.debug("User messages: %s", memories)
     msgs = [(memory['_from'], memory['content']) for memory in memories]
-    logging.info("Preparing history for llm")
-    history =  prepare_history_for_llm(msgs)
-    logging.debug("Prepared history: %s", history)
-    logging.info("Getting response from llm")
+    logger.info("Preparing history for llm")
+    history = prepare_history_for_llm(msgs)
+    logger.debug("Prepared history: %s", history)
+    logger.info("Getting response from llm")
     llm_response =  get_response(message, language, history)
-    logging.debug("response fromm llm: %s", llm_response)
+    logger.debug("response fromm llm: %s", llm_response)
     return llm_response
     
 
+def _send_no_counsellor(user, message, sender):
+    logger.info("Sending message to user")
+    logger.debug("User: %s, Message: %s", user, message)
+    response = router.route_message(DEFAULT_ROUTE, user, message)
+    logger.debug("Response from router: %s", response)
+    if "error" in response:
+        logger.error("Error sending message to %s: %s", user, response['error'])
+    else:
+        if response['sent']:
+            logger.info("Message sent successfully to user: %s", user)
+            save_conversation(sender, response['message'])
+
+def _send_multi_counsellors(user, message, sender):
+    logger.info("Sending message to user in multi-counsellor mode")
+    logger.debug("User: %s, Message: %s", user, message)
+    response = router.route_message(DEFAULT_ROUTE, user, message)
+    logger.debug("Response from router: %s", response)
+    if "error" in response:
+        logger.error("Error sending message to %s: %s", user, response['error'])
+    else:
+        logger.info("Message sent successfully to user: %s", user)
+        save_conversation(sender, response, user)
+
+def _hold_for_counsellor(user, user_profile, msg_data):
+    logger.info("User %s is assigned to a counsellor, skipping AI response", user)
+
+# Room and token a counsellor-handled user's messages go to, kept for a
+# short while so each forwarded message skips the ticket lookup. Dropped on
+# escalation, when the user's token changes and when a send fails.
+ROOM_ROUTE_TTL = 60  # seconds
+ROOM_ROUTE_CACHE_SIZE = 4096
+_room_routes = {}  # user -> (room_slug, auth_token, expires)
+_room_routes_lock = threading.Lock()
+
+def _cached_room_route(user):
+    with _room_routes_lock:
+        entry = _room_routes.get(user)
+    if entry is not None and time.monotonic() < entry[2]:
+        return entry[0], entry[1]
+    return None
+
+def _cache_room_route(user, room_slug, auth_token):
+    with _room_routes_lock:
+        if len(_room_routes) >= ROOM_ROUTE_CACHE_SIZE and user not in _room_routes:
+            _room_routes.pop(next(iter(_room_routes)))
+        _room_routes[user] = (room_slug, auth_token, time.monotonic() + ROOM_ROUTE_TTL)
+
+def invalidate_room_route(user):
+    with _room_routes_lock:
+        _room_routes.pop(user, None)
+
+def _forward_to_counsellor_room(user, user_profile, msg_data):
+    logger.info("Handling multi-counsellor mode")
+    route = _cached_room_route(user)
+    if route is not None:
+        room_slug, auth_token = route
+    else:
+        # In this mode, we might want to route the message to a specific counsellor
+        handler_agent = get_handler_agent(user)
+        room_slug = f'wa_{user}_{handler_agent}'
+        auth_token = user_profile['auth_key']
+        if auth_token is None:
+            logger.info("Auth token not found for user %s, generating a new one", user)
+            try:
+                fresh_token = chat_app.create_user_token(user)  
+            except Exception as e:
+                logger.error("Failed to create user token for user %s: %s", user, e)
+                return
+            users.update_user(user, "auth_key", fresh_token)
+            auth_token = fresh_token
+        if handler_agent is not None:
+            _cache_room_route(user, room_slug, auth_token)
+    #checking if room exist
+    #if chat_app.room_exist(room_slug, auth_token):
+    msg_body = msg_data['body']
+    response = chat_app.send_message(room_slug, msg_body, auth_token)
+    if response.get("error"):
+        logger.error("Failed to send message to room %s: %s", room_slug, response['error'])
+        invalidate_room_route(user)
+    #else:
+        #logging.warn("No room exist to send message")
+
+# What happens to a message from a user whose handler is "counsellor";
+# modes missing here fall through to the AI response
+_COUNSELLOR_IMPL = {
+    Mode.NO_COUNSELLOR: _hold_for_counsellor,
+    Mode.MULTI_COUNSELLORS_WP_WEB: _forward_to_counsellor_room,
+}
+
+# How send_message delivers in each mode; modes missing here don't send
+_SEND_IMPL = {
+    Mode.NO_COUNSELLOR: _send_no_counsellor,
+    Mode.MULTI_COUNSELLORS_WP: _send_multi_counsellors,
+    Mode.MULTI_COUNSELLORS_WP_WEB: _send_multi_counsellors,
+}
+
 def send_message(user, message, sender='ai_bot'):
-    default_route = os.getenv('DEFAULT_ROUTE', 'test_route')
-    if MODE == "no_counsellor":
-        logging.info("Sending message to user")
-        logging.debug("User: %s, Message: %s", user, message)
-        response = router.route_message(default_route, user, message)
-        print(f"Response from router: {response}")
-        if "error" in response:
-            print(f"Error sending message to {user}: {response['error']}")
-        else:
-            if response['sent']:
-                logging.info("Message sent successfully to user: %s", user)
-                save_conversation(sender, response['message'])
-    elif MODE in ["multi_counsellors_wp", "multi_counsellors_wp_web"]:
-        logging.info("Sending message to user in multi-counsellor mode")
-        logging.debug("User: %s, Message: %s", user, message)
-        response = router.route_message(default_route, user, message)
-        print(f"Response from router: {response}")
-        if "error" in response:
-            logging.error("Error sending message to %s: %s", user, response['error'])
-        else:
-            logging.info("Message sent successfully to user: %s", user)
-            save_conversation(sender, response, user)
+    send_impl = _SEND_IMPL.get(MODE)
+    if send_impl is not None:
+        send_impl(user, message, sender)
 
 def notify_counsellor(user, counsellor_id, ticket_id):
-    logging.info("Notifying counsellor %s about ticket %s", counsellor_id, ticket_id)
+    logger.info("Notifying counsellor %s about ticket %s", counsellor_id, ticket_id)
     # Implement notification logic here (e.g., send email or message)
-    if MODE == "no_counsellor":
+    if MODE == Mode.NO_COUNSELLOR:
         counsellor_wa_id = db.get_counsellor_channel_id(counsellor_id, "whatsapp")
         send_message(counsellor_wa_id, f"New ticket assigned: {ticket_id} from user: {user}. Please attend to it as soon as possible.")
-    elif MODE == "multi_counsellors_wp":
+    elif MODE == Mode.MULTI_COUNSELLORS_WP:
         user_token = chat_app.create_user_token(user)
         if db.update_user(user, "auth_key", user_token):
-            logging.info("User token updated successfully for user: %s", user)
+            users.invalidate_user_profile(user)
+            invalidate_room_route(user)
+            logger.info("User token updated successfully for user: %s", user)
         else:
-            logging.error("Failed to update user token for user: %s", user)    
+            logger.error("Failed to update user token for user: %s", user)    
         #return ticket id
         room_slug = chat_app.create_room(user, counsellor_id, user_token)
         #When user creates a room the automatically are made a member of that room
         #chat_app.join_room(user, room_slug, user_token)
-        # counsellor joins room
+        # counsellor joins room while the transcript is posted, the two calls are independent
         counsellor_token = counsellors.get_token(counsellor_id, "chat_app")
-        chat_app.join_room(counsellor_id, room_slug, counsellor_token)
+        join_future = _executor.submit(chat_app.join_room, counsellor_id, room_slug, counsellor_token)
         # send notification to counsellor
-        logging.debug("Getting transcript for ticket id: %s to send to counsellor", ticket_id)
+        logger.debug("Getting transcript for ticket id: %s to send to counsellor", ticket_id)
         ts = ticket.get_ticket(ticket_id)['transcript']
-        logging.debug('transcript: %s', ts)
+        logger.debug('transcript: %s', ts)
         try:
             chat_app.send_message(room_slug, ts, user_token)
-            logging.info("Transcript sent to counsellor: %s", counsellor_id)
+            logger.info("Transcript sent to counsellor: %s", counsellor_id)
         except Exception as e:
-            logging.error('Failed to send transcript: %s', e)
+            logger.error('Failed to send transcript: %s', e)
+        join_future.result()
 
 
 def escalate_to_counsellor(user):
     #change user handler to counsellor
-    logging.info("Escalating user %s to counsellor", user)
+    logger.info("Escalating user %s to counsellor", user)
     users.update_user_handler(user, "counsellor")
+    invalidate_room_route(user)
     #create a new ticket
     ticket_id = ticket.create_ticket(user)
     #get a counsellor
     counsellor_id = counsellors_select_algo.round_robin()
     #assign a counsellor
     if ticket.assign_handler(ticket_id, counsellor_id):
-        logging.info("Counsellor assigned successfully to ticket: %s", ticket_id)
+        logger.info("Counsellor assigned successfully to ticket: %s", ticket_id)
     else:
-       logging.error("Failed to assign counsellor to ticket: %s", ticket_id)
+       logger.error("Failed to assign counsellor to ticket: %s", ticket_id)
     #notify counsellor
     notify_counsellor(user, counsellor_id, ticket_id)
     return ticket_id
 
 def save_conversation(user, res, reciever=None):
-    logging.info("saving conversation")
-    logging.debug("user : %s, response to save: %s", user, res)
-    print("Saving conversation...")
-    print("User:", user)
-    print("Response:", res)
+    logger.info("saving conversation")
+    logger.debug("user : %s, response to save: %s", user, res)
     if res is None:
-        logging.warning("No message to save for user: %s", user)
+        logger.warning("No message to save for user: %s", user)
         return
     if 'sent' in res:
         res = res['message']
-    status = db.save_memory(res, user, receiver_id=reciever)
-    if not status:
-        print("Error saving conversation to database.")
-    else:
-        print("Conversation saved successfully.")
+    try:
+        row = db.memory_row(res, user, reciever)
+    except Exception as e:
+        logger.error("Error formatting message for %s: %s", user, e)
+        return
+    # Whoever flush_memory may be called for: the ids passed in and the row's sender/recipient
+    parties = frozenset(party for party in (user, reciever, row[0], row[1]) if party)
+    with _pending_cond:
+        for party in parties:
+            _pending_writes[party] = _pending_writes.get(party, 0) + 1
+    _memory_queue.put((row, parties))
 
 def notify_user_counsellor_assigned(user, language):
-    logging.info("Notifying user %s about assigned counsellor", user)
-    if language == 'fr':
-        msg = "Un conseiller vous a été attribué. Vous pouvez maintenant discuter avec eux."
-    else:
-        msg = "A counsellor has been assigned to you. You can now chat with them."
-    send_message(user, msg)
+    logger.info("Notifying user %s about assigned counsellor", user)
+    send_message(user, LOCALE.get(language, LOCALE['en'])['escalation'])
 
 def get_transcript(user):
-    logging.info("Generating transcript for user %s", user)
+    logger.info("Generating transcript for user %s", user)
     ts = transcript.generate_transcript(user)
-    logging.debug("transcript: %s", ts)
+    logger.debug("transcript: %s", ts)
     return ts
 
 def process_extracted_data(user, data):
-    logging.info("Processing extracted data for user %s: %s", user, data)
-    # Implement any processing logic needed for the extracted data
-    # For example, saving to database or updating user profile
-    for key, value in data.items():
-        if value == "none" or value == "":
-            continue
-        print(f"Updating user {user} data: {key} = {value}")
-        #db.update_user(user, key, value)
+    logger.info("Processing extracted data for user %s: %s", user, data)
+    # Every usable field goes into one UPDATE; keys that aren't user columns
+    # are ignored rather than rejecting the whole batch
+    fields = {key: value for key, value in data.items()
+              if value not in ("none", "") and key in db.USER_FIELDS}
+    if fields:
+        logger.debug("Updating user %s data: %s", user, fields)
+        users.update_user_fields(user, fields)
 
 def send_language_selection(user):
     """Send language selection buttons to user."""
-    logging.info("Sending language selection to user: %s", user)
-
-    # Create Whapi-compatible button message
-    language_options = {
-        'body': {'text': LANGUAGE_SELECTION_PROMPT},
-        'action': {
-            'buttons': [
-                {
-                    'type': 'quick_reply',
-                    'title': 'English 🇬🇧',
-                    'id': 'lang_en'
-                },
-                {
-                    'type': 'quick_reply',
-                    'title': 'Français 🇫🇷',
-                    'id': 'lang_fr'
-                }
-            ]
-        },
-        'type': 'button'
-    }
-
-    default_route = os.getenv('DEFAULT_ROUTE', 'test_route')
-    response = router.route_message(default_route, user, language_options, "options")
+    logger.info("Sending language selection to user: %s", user)
+
+    response = router.route_message(DEFAULT_ROUTE, user, LANGUAGE_OPTIONS, "options")
 
     if "error" in response:
-        logging.error("Error sending language selection to %s: %s", user, response['error'])
+        logger.error("Error sending language selection to %s: %s", user, response['error'])
         # Fallback to text message
         send_message(user, LANGUAGE_SELECTION_PROMPT + "\n\nReply 'English' or 'Français'")
     else:
-        logging.info("Language selection sent successfully to user: %s", user)
+        logger.info("Language selection sent successfully to user: %s", user)
 
     return response
 
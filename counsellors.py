@@ -3,6 +3,16 @@ from database import db
 import argparse
 import sys
 import json
+import threading
+import time
+
+# Usernames of all counsellors, reloaded every COUNSELLOR_SET_TTL seconds (so
+# changes made by another process, e.g. the dashboard, are picked up) and
+# straight away after add_counsellor/remove_counsellor in this process.
+COUNSELLOR_SET_TTL = 60  # seconds
+_counsellor_usernames = frozenset()
+_counsellor_expiry = 0.0
+_counsellor_lock = threading.RLock()
 
 
 def get_counsellors():
@@ -13,6 +23,29 @@ def get_counsellors():
     """
     return db.get_counsellors()
 
+def is_counsellor(username):
+    """Check whether a username belongs to a counsellor.
+
+    Args:
+        username (str): The username to check.
+
+    Returns:
+        bool: True if the username is a counsellor, False otherwise.
+    """
+    global _counsellor_usernames, _counsellor_expiry
+    if time.monotonic() >= _counsellor_expiry:
+        with _counsellor_lock:
+            if time.monotonic() >= _counsellor_expiry:
+                _counsellor_usernames = frozenset(db.get_counsellors())
+                _counsellor_expiry = time.monotonic() + COUNSELLOR_SET_TTL
+    return username in _counsellor_usernames
+
+def invalidate_counsellors():
+    """Force is_counsellor to reload the usernames on its next call."""
+    global _counsellor_expiry
+    with _counsellor_lock:
+        _counsellor_expiry = 0.0
+
 def assign_counsellor(ticket, counsellor):
     """Assign a counsellor to a user.
 
@@ -54,6 +87,7 @@ def add_counsellor(counsellor):
         return False
     
     if db.save_counsellor(counsellor):
+        invalidate_counsellors()
         return True
     return False
 
@@ -76,7 +110,7 @@ def add_channel(counsellor, channel, channel_id, auth_key=None, order=None):
         order (int): The rank of the channel.
     
     Returns:
-        bool: The status of the operation
+        int or None: 1 if added, 0 if the counsellor doesn't exist, None on failure
     """
 
     return db.add_counsellor_channel(counsellor, channel, channel_id, auth_key, order)
@@ -137,14 +171,16 @@ def remove_counsellor(counsellor):
         counsellor (str): The username of the counsellor to remove.
 
     Returns:
-        bool: True if the counsellor was removed successfully, False otherwise.
+        int or None: Number of counsellors removed (0 if none had that username),
+        None if the removal failed.
     """
-    status_deleted = db.delete_counsellor(counsellor)
+    deleted = db.delete_counsellor(counsellor)
+    if deleted:
+        invalidate_counsellors()
     status_channels_deleted = db.delete_all_counsellor_channels(counsellor)
-    status = status_deleted and status_channels_deleted
-    if status:
-        return True
-    return False
+    if deleted is None or not status_channels_deleted:
+        return None
+    return deleted
 
 
 # =============================================================================
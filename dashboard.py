@@ -12,38 +12,101 @@ import ticket
 import pandas as pd
 from datetime import datetime, timedelta
 import logging
+import threading
+import time
 from counsellor_handler import create_counsellor
 import os
+import sqlite3
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+COUNSELLOR_COLUMNS = ['ID', 'Username', 'Name', 'Email', 'Phone', 'Current Ticket']
+TICKET_COLUMNS = ['Ticket ID', 'Status', 'Handler', 'User', 'Created', 'Closed']
+MESSAGE_COLUMNS = ['From', 'To', 'Type', 'Content', 'Timestamp']
+
 
 # =============================================================================
 # HELPER FUNCTIONS
 # =============================================================================
 
+def query_frame(sql, params, columns):
+    """Run a query and build a DataFrame straight from the cursor rows.
+
+    The rows are streamed from the cursor into pandas, so no intermediate
+    list of per-row dicts is built. Column names come from ``columns``, in
+    SELECT order; an empty result gives an empty frame with those columns.
+    """
+    conn = db.connect_db()
+    try:
+        cur = conn.execute(sql, params)
+        return pd.DataFrame.from_records(cur, columns=columns)
+    finally:
+        db.close_db(conn)
+
+
+# Counsellors are added rarely, so the stats view reuses the count for a while
+COUNSELLOR_COUNT_TTL = 30  # seconds
+_counsellor_count_cache = {'value': None, 'expires': 0.0}
+
+
+def get_counsellor_count():
+    """Get the number of counsellors, cached for COUNSELLOR_COUNT_TTL seconds."""
+    now = time.monotonic()
+    if _counsellor_count_cache['value'] is None or now >= _counsellor_count_cache['expires']:
+        _counsellor_count_cache['value'] = db.count_counsellors()
+        _counsellor_count_cache['expires'] = now + COUNSELLOR_COUNT_TTL
+    return _counsellor_count_cache['value']
+
+
+def invalidate_counsellor_count():
+    """Drop the cached counsellor count after adding or removing counsellors."""
+    _counsellor_count_cache['value'] = None
+
+
+# How often the background thread recounts users, messages and tickets
+STATS_REFRESH_INTERVAL = int(os.getenv('STATS_REFRESH_INTERVAL', 30))  # seconds
+
+
+def start_stats_refresher(interval=STATS_REFRESH_INTERVAL):
+    """Recompute the system stats now, then every `interval` seconds in a daemon thread.
+
+    Keeps the full-table counts in db.update_system_stats() off the
+    dashboard's request path; views just read the stored values.
+    """
+    db.update_system_stats()
+
+    def refresh_loop():
+        while True:
+            time.sleep(interval)
+            db.update_system_stats()
+
+    thread = threading.Thread(target=refresh_loop, name='stats-refresher', daemon=True)
+    thread.start()
+    return thread
+
+
 def get_system_stats():
     """Get current system statistics."""
     try:
-        # Update stats first
-        db.update_system_stats()
-        
-        # Get all stats
-        stats = db.get_all_system_configs(category='stats')
-        config = db.get_all_system_configs(category='config')
-        health = db.get_all_system_configs(category='health')
+        # Stats rows are kept current by the background refresher
+        # (start_stats_refresher), so this only reads them.
+        # Get stats, config and health values in one query
+        configs = db.get_configs_bulk(('stats', 'config', 'health'))
+        stats = configs.get('stats', {})
+        config = configs.get('config', {})
+        health = configs.get('health', {})
         
         # Build stats dictionary
         stats_dict = {
-            'Total Users': stats['stats']['total_users']['value'] if stats else 0,
-            'Total Messages': stats['stats']['total_messages']['value'] if stats else 0,
-            'Active Tickets': stats['stats']['active_tickets']['value'] if stats else 0,
-            'Total Counsellors': len(db.get_counsellors()),
-            'DB Version': health['health']['db_version']['value'] if health else 0,
-            'Maintenance Mode': 'ON' if config['config']['maintenance_mode']['value'] else 'OFF',
-            'AI Model': config['config']['ai_model_version']['value'] if config else 'N/A'
+            'Total Users': stats.get('total_users', 0),
+            'Total Messages': stats.get('total_messages', 0),
+            'Active Tickets': stats.get('active_tickets', 0),
+            'Total Counsellors': get_counsellor_count(),
+            'DB Version': health.get('db_version', 0),
+            'Maintenance Mode': 'ON' if config.get('maintenance_mode') else 'OFF',
+            'AI Model': config.get('ai_model_version', 'N/A')
         }
         
         return stats_dict
@@ -64,93 +127,55 @@ def format_stats_for_display(stats_dict):
 def get_counsellors_data():
     """Get all counsellors as DataFrame."""
     try:
-        counsellors_list = db.get_counsellors_details()
-        
-        if not counsellors_list:
-            return pd.DataFrame(columns=['ID', 'Username', 'Name', 'Email', 'Phone', 'Current Ticket'])
-        
-        data = []
-        for c in counsellors_list:
-            data.append({
-                'ID': c[0],
-                'Username': c[2],
-                'Name': c[1] if c[1] else 'N/A',
-                'Email': c[4] if c[4] else 'N/A',
-                'Phone': c[5] if c[5] else 'N/A',
-                'Current Ticket': c[7] if c[7] else 'None'
-            })
-        
-        return pd.DataFrame(data)
+        return query_frame("""
+            SELECT id, 
+                   username, 
+                   COALESCE(NULLIF(name, ''), 'N/A'), 
+                   COALESCE(NULLIF(email, ''), 'N/A'), 
+                   COALESCE(NULLIF(phone, ''), 'N/A'), 
+                   COALESCE(NULLIF(current_ticket, ''), 'None') 
+            FROM counsellors
+        """, (), COUNSELLOR_COLUMNS)
     except Exception as e:
         logger.error(f"Error getting counsellors data: {e}")
-        return pd.DataFrame(columns=['ID', 'Username', 'Name', 'Email', 'Phone', 'Current Ticket'])
+        return pd.DataFrame(columns=COUNSELLOR_COLUMNS)
 
 
 def get_tickets_data():
     """Get all tickets as DataFrame."""
     try:
-        conn = db.connect_db()
-        cur = conn.cursor()
-        cur.execute("""
-            SELECT id, status, handler, user, created_at, closed_at 
+        return query_frame("""
+            SELECT id, 
+                   status, 
+                   COALESCE(NULLIF(handler, ''), 'Unassigned'), 
+                   user, 
+                   created_at, 
+                   COALESCE(NULLIF(closed_at, ''), 'Open') 
             FROM tickets 
             ORDER BY created_at DESC 
             LIMIT 100
-        """)
-        tickets = cur.fetchall()
-        db.close_db(conn)
-        
-        if not tickets:
-            return pd.DataFrame(columns=['Ticket ID', 'Status', 'Handler', 'User', 'Created', 'Closed'])
-        
-        data = []
-        for t in tickets:
-            data.append({
-                'Ticket ID': t[0],
-                'Status': t[1],
-                'Handler': t[2] if t[2] else 'Unassigned',
-                'User': t[3],
-                'Created': t[4],
-                'Closed': t[5] if t[5] else 'Open'
-            })
-        
-        return pd.DataFrame(data)
+        """, (), TICKET_COLUMNS)
     except Exception as e:
         logger.error(f"Error getting tickets data: {e}")
-        return pd.DataFrame(columns=['Ticket ID', 'Status', 'Handler', 'User', 'Created', 'Closed'])
+        return pd.DataFrame(columns=TICKET_COLUMNS)
 
 
 def get_recent_messages(limit=50):
     """Get recent messages as DataFrame."""
     try:
-        conn = db.connect_db()
-        cur = conn.cursor()
-        cur.execute("""
-            SELECT _from, _to, _type, content, timestamp 
+        return query_frame("""
+            SELECT _from, 
+                   _to, 
+                   _type, 
+                   CASE WHEN length(content) > 100 THEN substr(content, 1, 100) || '...' ELSE content END, 
+                   timestamp 
             FROM messages 
             ORDER BY timestamp DESC 
             LIMIT ?
-        """, (limit,))
-        messages = cur.fetchall()
-        db.close_db(conn)
-        
-        if not messages:
-            return pd.DataFrame(columns=['From', 'To', 'Type', 'Content', 'Timestamp'])
-        
-        data = []
-        for m in messages:
-            data.append({
-                'From': m[0],
-                'To': m[1],
-                'Type': m[2],
-                'Content': m[3][:100] + '...' if len(m[3]) > 100 else m[3],
-                'Timestamp': m[4]
-            })
-        
-        return pd.DataFrame(data)
+        """, (limit,), MESSAGE_COLUMNS)
     except Exception as e:
         logger.error(f"Error getting recent messages: {e}")
-        return pd.DataFrame(columns=['From', 'To', 'Type', 'Content', 'Timestamp'])
+        return pd.DataFrame(columns=MESSAGE_COLUMNS)
 
 
 # =============================================================================
@@ -239,6 +264,7 @@ def create_counsellor_from_form(username, name, email, password, phone, whatsapp
             name=name if name else username,
             whatsapp_number=whatsapp if whatsapp else None
         )
+        invalidate_counsellor_count()
         
         return f"✅ Counsellor '{username}' created successfully!", refresh_counsellors()
     
@@ -254,6 +280,7 @@ def delete_counsellor_action(username):
             return "❌ Error: Please enter a username", refresh_counsellors()
         
         if counsellors.remove_counsellor(username):
+            invalidate_counsellor_count()
             return f"✅ Counsellor '{username}' deleted successfully!", refresh_counsellors()
         else:
             return f"❌ Error: Failed to delete counsellor '{username}'", refresh_counsellors()
@@ -406,49 +433,44 @@ def build_tickets_tab():
 # TAB 4: MESSAGES
 # =============================================================================
 
+def fts_prefix_query(search_term):
+    """Quote a search term as an FTS5 prefix phrase so user input can't inject query syntax."""
+    return '"' + search_term.replace('"', '""') + '"*'
+
+
 def search_messages(search_term, limit=50):
     """Search messages by content or user."""
     try:
-        conn = db.connect_db()
-        cur = conn.cursor()
-        
         if search_term:
-            cur.execute("""
-                SELECT _from, _to, _type, content, timestamp 
-                FROM messages 
-                WHERE _from LIKE ? OR _to LIKE ? OR content LIKE ?
-                ORDER BY timestamp DESC 
-                LIMIT ?
-            """, (f'%{search_term}%', f'%{search_term}%', f'%{search_term}%', limit))
-        else:
-            cur.execute("""
-                SELECT _from, _to, _type, content, timestamp 
-                FROM messages 
-                ORDER BY timestamp DESC 
-                LIMIT ?
-            """, (limit,))
-        
-        messages = cur.fetchall()
-        db.close_db(conn)
-        
-        if not messages:
-            return pd.DataFrame(columns=['From', 'To', 'Type', 'Content', 'Timestamp'])
-        
-        data = []
-        for m in messages:
-            data.append({
-                'From': m[0],
-                'To': m[1],
-                'Type': m[2],
-                'Content': m[3],
-                'Timestamp': m[4]
-            })
-        
-        return pd.DataFrame(data)
+            try:
+                # Indexed token-prefix search (migration 13)
+                return query_frame("""
+                    SELECT m._from, m._to, m._type, m.content, m.timestamp 
+                    FROM messages_fts f 
+                    JOIN messages m ON m.rowid = f.rowid 
+                    WHERE messages_fts MATCH ? 
+                    ORDER BY m.timestamp DESC 
+                    LIMIT ?
+                """, (fts_prefix_query(search_term), limit), MESSAGE_COLUMNS)
+            except sqlite3.OperationalError as e:
+                logger.warning(f"Full-text search unavailable, falling back to LIKE: {e}")
+                return query_frame("""
+                    SELECT _from, _to, _type, content, timestamp 
+                    FROM messages 
+                    WHERE _from LIKE ? OR _to LIKE ? OR content LIKE ?
+                    ORDER BY timestamp DESC 
+                    LIMIT ?
+                """, (f'%{search_term}%', f'%{search_term}%', f'%{search_term}%', limit), MESSAGE_COLUMNS)
+        return query_frame("""
+            SELECT _from, _to, _type, content, timestamp 
+            FROM messages 
+            ORDER BY timestamp DESC 
+            LIMIT ?
+        """, (limit,), MESSAGE_COLUMNS)
     
     except Exception as e:
         logger.error(f"Error searching messages: {e}")
-        return pd.DataFrame(columns=['From', 'To', 'Type', 'Content', 'Timestamp'])
+        return pd.DataFrame(columns=MESSAGE_COLUMNS)
 
 
 def build_messages_tab():
@@ -603,6 +625,9 @@ def build_dashboard():
 
 
 if __name__ == "__main__":
+    # Keep system stats fresh in the background
+    start_stats_refresher()
+    
     # Build and launch dashboard
     dashboard = build_dashboard()
     
@@ -78,26 +78,25 @@ def load_question_list(question_file):
     try:
         with open(question_file, "r", encoding="utf-8") as question_json:
             questions = json.load(question_json)
-            logging.info(f"Loaded questions from file:{question_file}")
-            logging.debug(f"Loaded {questions} from {question_file}")
+            logging.info("Loaded questions from file:%s", question_file)
+            logging.debug("Loaded %s from %s", questions, question_file)
             return questions
     except FileNotFoundError as e:
-        logging.error(f"Failed to load file {question_file} with error {str(e)}")      
+        logging.error("Failed to load file %s with error %s", question_file, e)      
     
 
 def send_question(user_id, question, options):
-    logging.debug(f"Sending question")
-    res1 = router.route_message('default_route',user_id, question)
-    if res1['error']:
-        logging.error(f"Failed to send question: {res1['error']}")
+    logging.debug("Sending question")
+    messages = [(question, "text")]
+    if options:
+        messages.append((options, "options"))
+    responses = router.route_messages('default_route', user_id, messages)
+    error = responses[-1].get('error')
+    if error:
+        logging.error("Failed to send question: %s", error)
         return False
-    logging.debug("Sending question: {question} to user {user_id} succesful")
-    
+    logging.debug("Sending question: %s to user %s succesful", question, user_id)
     if options:
-        res2 = router.route_message("default_route", user_id, options, "options")
-        if res2['error']:
-            logging.error(f"Failed to send question: {res1['error']}")
-            return False
-        logging.debug("Sending options: {options} to user {user_id} succesful")
+        logging.debug("Sending options: %s to user %s succesful", options, user_id)
     
     return True
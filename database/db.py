@@ -2,26 +2,34 @@
 Database utility functions for managing users, counsellors, tickets, and messages.
 Uses SQLite for data storage and retrieval.
 Functions:
-    - connect_db(): Connect to the SQLite database.
-    - close_db(conn): Close the database connection.
+    - connect_db(): Get this thread's pooled connection to the SQLite database.
+    - close_db(conn): Release a connection obtained from connect_db().
+    - disconnect_db(): Really close this thread's pooled connection.
     - init_db(): Initialize the database with the schema.
     - user_exist(user_id): Check if a user exists.
-    - save_user(user_id): Save a new user.
+    - save_user(user_id, handler): Save a new user.
     - update_user_handler(user_id, handler): Update user's handler.
     - update_user(user_id, field, data): Update specific user field.
+    - update_user_fields(user_id, fields): Update several user fields at once.
     - get_user_count(): Get total number of users.
     - get_all_users(): Retrieve all users.
     - get_user_profile(user_id): Get a user's profile.
+    - get_user_handler(user_id): Get just the handler assigned to a user.
     - delete_user_profile(user_id): Delete a user's profile.
     - counsellor_exist(counsellor_id): Check if a counsellor exists.
     - save_counsellor(counsellor): Save a new counsellor.
     - get_counsellors_ids(): Get all counsellor IDs.
+    - count_counsellors(): Get total number of counsellors.
+    - update_counsellor_fields(counsellor, fields): Update several counsellor fields at once.
     - create_ticket(user_id, transcript): Create a support ticket.
     - get_ticket(ticket_id): Retrieve a ticket by ID.
     - update_ticket_status(ticket_id, status): Update ticket status.
     - get_open_tickets(): Get all open tickets.
-    - get_memory(user_id): Retrieve messages for a user.
+    - get_memory(user_id, limit=None): Retrieve messages for a user.
     - save_memory(message): Save a message to the database.
+    - save_memory_batch(entries): Save several messages in one transaction.
+    - memory_row(message, user_id, receiver_id): Format a message as a messages row.
+    - save_memory_rows(rows): Save formatted message rows in one transaction.
     - delete_memory(user_id): Delete all messages for a user.
     - delete_message(message_id): Delete a specific message by ID.
     - get_conversation_history(user_id): Get conversation history for a user.
@@ -32,12 +40,15 @@ Functions:
     - get_system_config(key, category): Get a system configuration value.
     - set_system_config(key, value, category): Set a system configuration value.
     - get_all_system_configs(category): Get all system configurations.
+    - get_configs_bulk(categories): Get typed config values for several categories at once.
     - update_system_stats(): Update system statistics (users, messages, tickets).
 """
 import datetime
 import sqlite3
 import os
 import sys
+import threading
+import time
 
 # Add parent directory to path to allow imports when running directly
 if __name__ == "__main__":
@@ -58,27 +69,86 @@ else:
     logging.basicConfig(level=getattr(logging, logging_level, logging.INFO))
     #logging.info("Logging initialized without logging file.")
 
+DB_PATH = 'chatbot.db'
+# Pooled connections older than this are closed and reopened on the next
+# connect_db(), so a long-lived worker thread doesn't hold one forever.
+DB_CONNECTION_MAX_AGE = int(os.getenv('DB_CONNECTION_MAX_AGE', 1800))  # seconds
+
+# One connection per thread, opened lazily and reused for the life of the
+# thread instead of reconnecting (and re-reading pragmas) on every call.
+_local = threading.local()
+
+def _open_connection():
+    """
+    Open a new SQLite connection configured for the pool.
+
+    WAL lets readers (the dashboard) run alongside the webhook's writes, and
+    synchronous=NORMAL is durable in WAL mode while skipping an fsync per commit.
+
+    Returns:
+        sqlite3.Connection: Database connection object.
+    """
+    logging.debug("Opening pooled database connection")
+    # The pooled connections live for the whole thread, so give them a larger
+    # prepared-statement cache than the default 128 to keep every query the
+    # app and dashboard issue compiled.
+    conn = sqlite3.connect(DB_PATH, timeout=10.0, check_same_thread=False, cached_statements=256)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA cache_size=-64000")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    return conn
+
 def connect_db():
     """
-    Connect to the SQLite database.
+    Get this thread's connection to the SQLite database.
+    
+    The connection is created on first use and then reused; pair every call
+    with close_db(conn) as before.
     
     Returns:
         sqlite3.Connection: Database connection object.
     """
-    logging.debug("Connecting to database")
-    conn = sqlite3.connect('chatbot.db', timeout=10.0)
-    conn.row_factory = sqlite3.Row
+    conn = getattr(_local, 'conn', None)
+    if conn is not None and time.monotonic() - _local.opened > DB_CONNECTION_MAX_AGE:
+        logging.debug("Recycling pooled database connection")
+        disconnect_db()
+        conn = None
+    if conn is None:
+        conn = _open_connection()
+        _local.conn = conn
+        _local.opened = time.monotonic()
+    elif conn.in_transaction:
+        # A previous caller raised before committing or closing; don't let
+        # its half-done work leak into this one.
+        conn.rollback()
     return conn
 
 def close_db(conn):
     """
-    Close the database connection.
+    Release a connection obtained from connect_db().
+    
+    The pooled connection stays open. Uncommitted changes are rolled back,
+    exactly as closing the connection used to discard them.
     
     Args:
-        conn (sqlite3.Connection): Database connection to close.
+        conn (sqlite3.Connection): Database connection to release.
+    """
+    if conn.in_transaction:
+        conn.rollback()
+
+def disconnect_db():
+    """
+    Close this thread's pooled connection, if any.
+    
+    The next connect_db() call on this thread opens a fresh connection.
     """
-    logging.debug("Closing database connection")
-    conn.close()
+    conn = getattr(_local, 'conn', None)
+    if conn is not None:
+        logging.debug("Closing pooled database connection")
+        _local.conn = None
+        conn.close()
 
 def init_db():
     """
@@ -138,12 +208,13 @@ def user_exist(user_id):
     logging.info(f"User {user_id} exists: {exists}")
     return True if exists else False
 
-def save_user(user_id):
+def save_user(user_id, handler="ai_bot"):
     """
-    Save a new user to the database with default AI bot handler.
+    Save a new user to the database, by default with the AI bot handler.
     
     Args:
         user_id (str): The unique identifier for the new user.
+        handler (str): The handler to assign to the user (default: "ai_bot").
         
     Returns:
         bool: True if user was saved successfully.
@@ -151,10 +222,10 @@ def save_user(user_id):
     logging.info(f"Attempting to save new user: {user_id}")
     conn = connect_db()
     cur = conn.cursor()
-    cur.execute("INSERT INTO users (id, handler) VALUES (?, ?)", (user_id, "ai_bot"))
+    cur.execute("INSERT INTO users (id, handler) VALUES (?, ?)", (user_id, handler))
     conn.commit()
     close_db(conn)
-    logging.info(f"Successfully saved user: {user_id} with handler: ai_bot")
+    logging.info(f"Successfully saved user: {user_id} with handler: {handler}")
     return True
 
 def update_user_handler(user_id, handler):
@@ -177,6 +248,17 @@ def update_user_handler(user_id, handler):
     logging.info(f"Successfully updated handler for user: {user_id}")
     return True
 
+# Whitelist of updatable fields (based on users table schema)
+USER_FIELDS = (
+    "handler", "auth_key", "gender", "age_range",  # Original fields
+    "language",  # Migration 1
+    "age", "number_of_children", "location", "disability",  # Migration 8
+    "arv", "internally_displaced", "occupation",  # Migration 8
+    "last_menstrual_flow", "marital_status",  # Migration 8
+    "onboarding_level",  # Migration 10
+    "religious_background"  # Migration 11
+)
+
 def update_user(user_id, field, data):
     """
     Update a specific field for a user.
@@ -194,20 +276,9 @@ def update_user(user_id, field, data):
     """
     logging.debug(f"Attempting to update user {user_id}, field: {field}")
 
-    # Whitelist of allowed fields (based on users table schema)
-    allowed_fields = [
-        "handler", "auth_key", "gender", "age_range",  # Original fields
-        "language",  # Migration 1
-        "age", "number_of_children", "location", "disability",  # Migration 8
-        "arv", "internally_displaced", "occupation",  # Migration 8
-        "last_menstrual_flow", "marital_status",  # Migration 8
-        "onboarding_level",  # Migration 10
-        "religious_background"  # Migration 11
-    ]
-
     conn = connect_db()
     cur = conn.cursor()
-    if field not in allowed_fields:
+    if field not in USER_FIELDS:
         logging.error(f"Invalid field name attempted: {field}")
         raise ValueError("Invalid field name")
     query = f"UPDATE users SET {field} = ? WHERE id = ?"
@@ -217,6 +288,34 @@ def update_user(user_id, field, data):
     logging.info(f"Successfully updated user {user_id}, field: {field}")
     return True
 
+def update_user_fields(user_id, fields):
+    """
+    Update several fields for a user in one statement.
+
+    Args:
+        user_id (str): The unique identifier of the user.
+        fields (dict): Field name -> new data; names must be in USER_FIELDS.
+
+    Returns:
+        int: Number of rows updated (0 if the user doesn't exist).
+
+    Raises:
+        ValueError: If a field name is not valid.
+    """
+    logging.debug(f"Attempting to update user {user_id}, fields: {list(fields)}")
+    invalid = [field for field in fields if field not in USER_FIELDS]
+    if invalid or not fields:
+        logging.error(f"Invalid field names attempted: {invalid or 'none given'}")
+        raise ValueError("Invalid field name")
+    set_clause = ", ".join(f"{field} = ?" for field in fields)
+    conn = connect_db()
+    cur = conn.cursor()
+    cur.execute(f"UPDATE users SET {set_clause} WHERE id = ?", (*fields.values(), user_id))
+    conn.commit()
+    close_db(conn)
+    logging.info(f"Updated {cur.rowcount} user(s) {user_id}, fields: {list(fields)}")
+    return cur.rowcount
+
 def get_user_count():
     """
     Get the total number of users in the database.
@@ -271,6 +370,24 @@ def get_user_profile(user_id):
         logging.warning(f"No profile found for user: {user_id}")
     return profile
 
+def get_user_handler(user_id):
+    """
+    Get the handler currently assigned to a user.
+
+    Args:
+        user_id (str): The unique identifier of the user.
+
+    Returns:
+        str or None: The user's handler, or None if the user does not exist.
+    """
+    logging.debug(f"Retrieving handler for user: {user_id}")
+    conn = connect_db()
+    cur = conn.cursor()
+    cur.execute("SELECT handler FROM users WHERE id = ?", (user_id,))
+    row = cur.fetchone()
+    close_db(conn)
+    return row[0] if row else None
+
 def delete_user_profile(user_id):
     """
     Delete a user's profile from the database.
@@ -349,6 +466,21 @@ def get_counsellors():
     logging.info(f"Retrieved {len(usernames)} counsellors usernames")
     return usernames
 
+def count_counsellors():
+    """
+    Get the total number of counsellors in the database.
+    
+    Returns:
+        int: Total count of counsellors.
+    """
+    logging.debug("Retrieving total counsellor count")
+    conn = connect_db()
+    cur = conn.cursor()
+    cur.execute("SELECT COUNT(*) FROM counsellors")
+    count = cur.fetchone()[0]
+    close_db(conn)
+    return count
+
 def get_counsellor(counsellor):
     """
     Get a counsellor's details by their ID.
@@ -395,7 +527,8 @@ def update_counsellor(counsellor, field, data):
         data (str): The new value for the field.
     
     Returns:
-        status(bool):The status of the operation
+        int or None: Number of rows updated (0 if the counsellor doesn't exist),
+        None if the update failed.
     """
     logging.info(f"Attempting to update counsellor {counsellor}, field: {field}")
     conn = connect_db()
@@ -404,12 +537,45 @@ def update_counsellor(counsellor, field, data):
         cur.execute(f"UPDATE counsellors SET {field} = ? WHERE username = ?", (data, counsellor))
         conn.commit()
         close_db(conn)
-        logging.info(f"Successfully updated counsellor {counsellor}, field: {field}")
-        return True
+        logging.info(f"Updated {cur.rowcount} counsellor(s) {counsellor}, field: {field}")
+        return cur.rowcount
     except Exception as e:
         logging.error(f"Error updating counsellor {counsellor}: {e}")
         close_db(conn)
-        return False
+        return None
+
+# Columns update_counsellor_fields may write; anything else is rejected
+COUNSELLOR_FIELDS = ('name', 'username', 'password', 'email', 'phone', 'channels', 'current_ticket')
+
+def update_counsellor_fields(counsellor, fields):
+    """Updates several fields of a counsellor in one statement
+
+    Args:
+        counsellor (str): The username of the counsellor to update.
+        fields (dict): Column name -> new value; names must be in COUNSELLOR_FIELDS.
+    
+    Returns:
+        int or None: Number of rows updated (0 if the counsellor doesn't exist),
+        None if the update failed.
+    """
+    logging.info(f"Attempting to update counsellor {counsellor}, fields: {list(fields)}")
+    invalid = [field for field in fields if field not in COUNSELLOR_FIELDS]
+    if invalid or not fields:
+        logging.error(f"Invalid fields for counsellor update: {invalid or 'none given'}")
+        return None
+    set_clause = ", ".join(f"{field} = ?" for field in fields)
+    conn = connect_db()
+    try:
+        cur = conn.cursor()
+        cur.execute(f"UPDATE counsellors SET {set_clause} WHERE username = ?", (*fields.values(), counsellor))
+        conn.commit()
+        close_db(conn)
+        logging.info(f"Updated {cur.rowcount} counsellor(s) {counsellor}, fields: {list(fields)}")
+        return cur.rowcount
+    except Exception as e:
+        logging.error(f"Error updating counsellor {counsellor}: {e}")
+        close_db(conn)
+        return None
 
 def delete_counsellor(username):
     """Delete a counsellor from the database
@@ -418,7 +584,8 @@ def delete_counsellor(username):
         username (str): The id of the counsellor to be deleted
     
     Return:
-        bool: Status of the delete
+        int or None: Number of rows deleted (0 if the counsellor doesn't exist),
+        None if the delete failed.
     """
     logging.info(f"Attempting to delete counsellor: {username}")
     try:
@@ -427,11 +594,11 @@ def delete_counsellor(username):
         cur.execute("DELETE FROM counsellors WHERE username = ?", (username,))
         conn.commit()
         close_db(conn)
-        logging.info(f"Successfully deleted counsellor: {username}")
-        return True
+        logging.info(f"Deleted {cur.rowcount} counsellor(s): {username}")
+        return cur.rowcount
     except Exception as e:
         logging.error(f"Error deleting counsellor {username}: {e}")
-        return False
+        return None
 
 def create_ticket(user_id, ticket_id, transcript):
     """
@@ -570,25 +737,65 @@ def assign_ticket_handler(ticket_id, handler):
     logging.info(f"Successfully assigned handler to ticket: {ticket_id}")
     return True
 
-def get_memory(user_id):
+def get_memory(user_id, limit=None):
     """
-    Retrieve all messages for a specific user.
+    Retrieve the messages for a specific user.
     
     Args:
         user_id (str): The unique identifier of the user.
+        limit (int, optional): Only return the most recent `limit` messages.
         
     Returns:
-        list: List of tuples containing message data where user is sender or recipient.
+        list: List of tuples containing message data where user is sender or recipient,
+              oldest first.
     """
     logging.debug(f"Retrieving memory for user: {user_id}")
     conn = connect_db()
     cur = conn.cursor()
-    cur.execute("SELECT * FROM messages WHERE _from = ? OR _to = ? OR id = ?", (user_id, user_id, user_id))
-    result = cur.fetchall()
+    if limit is None:
+        cur.execute("SELECT * FROM messages WHERE _from = ? OR _to = ? OR id = ?", (user_id, user_id, user_id))
+        result = cur.fetchall()
+    else:
+        # Newest first so LIMIT keeps the tail, then back to insertion order
+        cur.execute("SELECT * FROM messages WHERE _from = ? OR _to = ? OR id = ? ORDER BY rowid DESC LIMIT ?",
+                    (user_id, user_id, user_id, limit))
+        result = cur.fetchall()[::-1]
     close_db(conn)
     logging.info(f"Retrieved {len(result)} messages for user: {user_id}")
     return result
 
+def memory_row(message, user_id, receiver_id=None):
+    """
+    Turn a message (webhook dict or plain string) into a messages table row.
+    
+    Returns:
+        tuple: (_from, _to, _type, content, source, timestamp)
+    """
+    if isinstance(message, str):
+        logging.warning("Received message as string, converting to dict")
+        data = {
+            "id": user_id if user_id else "unknown",
+            "from": user_id if user_id else "unknown",
+            "to": receiver_id if receiver_id else "ai_bot",
+            "type": "text",
+            "body": message,
+            "source": "unknown",
+            "timestamp": datetime.datetime.now().timestamp()
+        }
+        logging.debug("Converted string message to dict: %s", message)
+    else:
+        logging.debug("Received message as dict: %s", message)
+        logging.debug("Formatting message for database insertion")
+        data = get_chat_data(message)
+    if 'to' not in data or not data['to']:
+        data['to'] = receiver_id if receiver_id else "ai_bot"
+    if logging.getLogger().isEnabledFor(logging.DEBUG):
+        logging.debug(f"Saving message from: {data.get('from', 'unknown')}, message_data: {data}")
+    return (data['from'], data['to'], data['type'], data['body'], data['source'], data['timestamp'])
+
+# Note: 'id' is auto-generated (SERIAL PRIMARY KEY), so we don't insert it
+INSERT_MESSAGE_SQL = "INSERT INTO messages (_from, _to, _type, content, source, timestamp) VALUES (?, ?, ?, ?, ?, ?)"
+
 def save_memory(message, user_id, receiver_id=None):
     """
     Save a message to the database.
@@ -602,35 +809,13 @@ def save_memory(message, user_id, receiver_id=None):
         bool: True if message was saved successfully.
     """
     try:
-        if isinstance(message, str):
-            logging.warning("Received message as string, converting to dict")
-            data = {
-                "id": user_id if user_id else "unknown",
-                "from": user_id if user_id else "unknown",
-                "to": receiver_id if receiver_id else "ai_bot",
-                "type": "text",
-                "body": message,
-                "source": "unknown",
-                "timestamp": datetime.datetime.now().timestamp()
-            }
-            logging.debug(f"Converted string message to dict: {message}")
-        else:
-            logging.debug(f"Received message as dict: {message}")
-            logging.debug("Formatting message for database insertion")
-            data = get_chat_data(message)
-            print(data)
-        if 'to' not in data or not data['to']:
-            data['to'] = receiver_id if receiver_id else "ai_bot"
-        logging.debug(f"Saving message from: {data.get('from', 'unknown')}, message_data: {data}")
-        print(f"Saving message from: {data.get('from', 'unknown')}, message_data: {data}")
+        row = memory_row(message, user_id, receiver_id)
         conn = connect_db()
         cur = conn.cursor()
-        # Note: 'id' is auto-generated (SERIAL PRIMARY KEY), so we don't insert it
-        cur.execute("INSERT INTO messages (_from, _to, _type, content, source, timestamp) VALUES (?, ?, ?, ?, ?, ?)",
-                    (data['from'], data['to'], data['type'], data['body'], data['source'], data['timestamp']))
+        cur.execute(INSERT_MESSAGE_SQL, row)
         conn.commit()
         close_db(conn)
-        logging.info(f"Successfully saved message from: {data['from']}")
+        logging.info(f"Successfully saved message from: {row[0]}")
         return True
     except sqlite3.OperationalError as e:
         logging.error(f"Database locked error when saving message: {e}")
@@ -640,6 +825,51 @@ def save_memory(message, user_id, receiver_id=None):
         logging.error(f"Error saving message: {e}")
         return False
 
+def save_memory_batch(entries):
+    """
+    Save several messages with one executemany and a single commit.
+    
+    Args:
+        entries (list): (message, user_id, receiver_id) tuples, each as
+                        accepted by save_memory().
+                       
+    Returns:
+        bool: True if all messages were saved successfully.
+    """
+    rows = []
+    for message, user_id, receiver_id in entries:
+        try:
+            rows.append(memory_row(message, user_id, receiver_id))
+        except Exception as e:
+            # One malformed message shouldn't cost the rest of the batch
+            logging.error(f"Error formatting message for {user_id}: {e}")
+    return save_memory_rows(rows) and len(rows) == len(entries)
+
+def save_memory_rows(rows):
+    """
+    Save already formatted message rows with one executemany and a single commit.
+    
+    Args:
+        rows (list): Rows as returned by memory_row().
+                       
+    Returns:
+        bool: True if the rows were saved successfully.
+    """
+    try:
+        conn = connect_db()
+        cur = conn.cursor()
+        cur.executemany(INSERT_MESSAGE_SQL, rows)
+        conn.commit()
+        close_db(conn)
+        logging.info(f"Successfully saved {len(rows)} messages")
+        return True
+    except sqlite3.OperationalError as e:
+        logging.error(f"Database locked error when saving messages: {e}")
+        return False
+    except Exception as e:
+        logging.error(f"Error saving messages: {e}")
+        return False
+
 def delete_memory(user_id):
     """
     Delete all messages associated with a user.
@@ -726,9 +956,14 @@ def clear_all_data():
         bool: True if database was cleared and reinitialized successfully.
     """
     logging.warning("Clearing all database data - this is irreversible!")
-    if os.path.exists('chatbot.db'):
-        os.remove('chatbot.db')
+    disconnect_db()
+    if os.path.exists(DB_PATH):
+        os.remove(DB_PATH)
         logging.info("Database file removed")
+    # Leftover WAL files would otherwise be replayed into the new database
+    for suffix in ('-wal', '-shm'):
+        if os.path.exists(DB_PATH + suffix):
+            os.remove(DB_PATH + suffix)
     init_db()
     logging.info("Database reinitialized with schema")
     return True
@@ -744,7 +979,8 @@ def add_counsellor_channel(counsellor_username, channel, channel_id, auth_key=No
         order (int): the rank of the channel, default none
 
     Returns:
-        bool: True if channel was added successfully.
+        int or None: 1 if the channel was added, 0 if the counsellor doesn't
+        exist, None if the insert failed.
 
     To do:
         Add checks to make sure that channels that belong to the
@@ -755,13 +991,17 @@ def add_counsellor_channel(counsellor_username, channel, channel_id, auth_key=No
     try:
         conn = connect_db()
         cur = conn.cursor()
-        cur.execute("INSERT INTO channels (counsellor_username, channel, channel_id, auth_key, order_priority) VALUES (?, ?, ?, ?, ?)",(counsellor_username, channel, channel_id, auth_key, order))
+        # Only insert when the counsellor exists, so the row count doubles as the existence check
+        cur.execute("""INSERT INTO channels (counsellor_username, channel, channel_id, auth_key, order_priority)
+                       SELECT ?, ?, ?, ?, ? WHERE EXISTS (SELECT 1 FROM counsellors WHERE username = ?)""",
+                    (counsellor_username, channel, channel_id, auth_key, order, counsellor_username))
         conn.commit()
-        logging.info(f"Successfully added channel {channel} to counsellor {counsellor_username}")
-        return True
+        close_db(conn)
+        logging.info(f"Added {cur.rowcount} channel(s) {channel} to counsellor {counsellor_username}")
+        return cur.rowcount
     except Exception as e:
         logging.error(f"Error adding channel to counsellor {counsellor_username}: {e}")
-        return False
+        return None
 
 def get_counsellor_channels(counsellor_username):
     """
@@ -1060,6 +1300,50 @@ def get_all_system_configs(category=None):
         close_db(conn)
 
 
+def get_configs_bulk(categories=('stats', 'config', 'health')):
+    """
+    Get the typed configuration values of several categories in one query.
+    
+    Args:
+        categories (tuple): Categories to fetch (default: stats, config, health).
+        
+    Returns:
+        dict: {category: {key: value}} with values converted by data_type;
+              empty dict on error.
+    """
+    logging.debug(f"Retrieving system configs for categories: {categories}")
+    if not categories:
+        return {}
+    conn = connect_db()
+    cur = conn.cursor()
+    
+    try:
+        placeholders = ", ".join("?" for _ in categories)
+        cur.execute(
+            f"SELECT category, key, value, data_type FROM system_metadata WHERE category IN ({placeholders})",
+            tuple(categories)
+        )
+        configs = {category: {} for category in categories}
+        for cat, key, value, data_type in cur:
+            if data_type == 'int':
+                typed_value = int(value) if value else 0
+            elif data_type == 'bool':
+                typed_value = value.lower() == 'true' if value else False
+            elif data_type == 'json':
+                import json
+                typed_value = json.loads(value) if value else None
+            else:
+                typed_value = value
+            configs[cat][key] = typed_value
+        return configs
+        
+    except Exception as e:
+        logging.error(f"Error retrieving system configs for {categories}: {e}")
+        return {}
+    finally:
+        close_db(conn)
+
+
 def update_system_stats():
     """
     Update system statistics (total users, messages, active tickets).
@@ -360,6 +360,55 @@ MIGRATIONS = [
         ]
     },
 
+    # Migration 12: Index for the dashboard ticket listing (ORDER BY created_at DESC)
+    {
+        'version': 12,
+        'description': 'Add index on tickets(created_at)',
+        'sql': [
+            "CREATE INDEX IF NOT EXISTS idx_tickets_created_at ON tickets(created_at DESC)"
+        ]
+    },
+
+    # Migration 13: Full-text index over messages for dashboard search
+    # messages.id is declared SERIAL, which SQLite does not treat as a rowid
+    # alias, so the FTS table is keyed on the implicit rowid instead.
+    {
+        'version': 13,
+        'description': 'Add messages_fts FTS5 table (with sync triggers) for message search',
+        'sql': [
+            """CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+                _from, _to, content, content='messages', tokenize='unicode61'
+            )""",
+            """CREATE TRIGGER IF NOT EXISTS messages_fts_ai AFTER INSERT ON messages BEGIN
+                INSERT INTO messages_fts(rowid, _from, _to, content)
+                VALUES (new.rowid, new._from, new._to, new.content);
+            END""",
+            """CREATE TRIGGER IF NOT EXISTS messages_fts_ad AFTER DELETE ON messages BEGIN
+                INSERT INTO messages_fts(messages_fts, rowid, _from, _to, content)
+                VALUES ('delete', old.rowid, old._from, old._to, old.content);
+            END""",
+            """CREATE TRIGGER IF NOT EXISTS messages_fts_au AFTER UPDATE ON messages BEGIN
+                INSERT INTO messages_fts(messages_fts, rowid, _from, _to, content)
+                VALUES ('delete', old.rowid, old._from, old._to, old.content);
+                INSERT INTO messages_fts(rowid, _from, _to, content)
+                VALUES (new.rowid, new._from, new._to, new.content);
+            END""",
+            # Index the messages that already exist
+            "INSERT INTO messages_fts(messages_fts) VALUES ('rebuild')"
+        ]
+    },
+
+    # Migration 14: Index the recipient column for conversation history lookups
+    # get_memory filters on _from OR _to; with both sides indexed SQLite can
+    # answer the OR from the indexes instead of scanning messages.
+    {
+        'version': 14,
+        'description': 'Add index on messages(_to)',
+        'sql': [
+            "CREATE INDEX IF NOT EXISTS idx_messages_to ON messages(_to)"
+        ]
+    },
+
     # Example Migration 3: Create a new table
     # {
     #     'version': 3,
@@ -1,57 +1,84 @@
 import os
+import sqlite3
 from flask import Flask, request, jsonify
+from flask.json.provider import DefaultJSONProvider
 from dotenv import load_dotenv
-from chat_handler import incoming_messages
+from chat_handler import enqueue_incoming_message
 import counsellors
 import database.db as db
 import logging
 from counsellor_handler import create_counsellor
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 load_dotenv()  # Load environment variables from a .env file
 
+
+class RowJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider that also serializes sqlite3.Row objects as dicts.
+
+    Rows are converted one at a time while the response is encoded, so query
+    results can go straight into jsonify without building a list of dicts.
+    """
+
+    @staticmethod
+    def default(o):
+        if isinstance(o, sqlite3.Row):
+            return dict(o)
+        return DefaultJSONProvider.default(o)
+
+
+class ORJSONProvider(RowJSONProvider):
+    """Flask JSON provider backed by orjson, used for jsonify and request.json."""
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default, option=orjson.OPT_NON_STR_KEYS).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+
 app = Flask(__name__)
+app.json = ORJSONProvider(app) if orjson is not None else RowJSONProvider(app)
 
 # Configure logging
 logging_level = os.getenv('LOGGING_LEVEL', 'INFO').upper()
 logger = logging.getLogger(__name__)
 
-       
 
 # The Webhook link to your server is set in the dashboard. For this script it is important that the link is in the format: {link to server}/hook.
 @app.route('/hook/messages', methods=['POST'])
 def handle_new_messages():
     
     try:
-        print('Webhook requests: ', request.json)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Webhook requests: %s", request.json)
         messages = request.json.get('messages', [])
         #events = request.json.get('event')
         
         for message in messages:
-            print(message)
             # Ignore messages from the bot itself
             if message.get('from_me'):
                 continue
 
             response_type = message.get('type', {}).strip().lower()
-            print(response_type)
             user_id = message.get('chat_id')
 
             if response_type == 'text':
-                user_response = message.get('text', {}).get('body', '').strip().lower()
-                print(user_response)
                 #handler(bots, user_response, user_id)
-                incoming_messages(user_id, message)
+                enqueue_incoming_message(user_id, message)
             #To do complete handling of other message types
             elif response_type == 'reply':
                 reply = message.get('reply')
-                print('reply-object: ', reply.get('type')=='buttons_reply')
                 if reply.get('type') == 'buttons_reply':
                     buttons_reply = reply.get('buttons_reply')
                     button_id = buttons_reply.get('id')
                     button_title = buttons_reply.get('title', '')
 
-                    print('button_id:', button_id)
-                    print('button_title:', button_title)
+                    logger.debug("button_id: %s, button_title: %s", button_id, button_title)
 
                     # Create a properly formatted message object for incoming_messages
                     # Include both the button ID and the button text
@@ -63,7 +90,7 @@ def handle_new_messages():
                         'id': button_id  # The button ID for identification
                     }
 
-                    incoming_messages(user_id, button_message)
+                    enqueue_incoming_message(user_id, button_message)
             elif response_type == 'unknown':
                 continue
             else:
@@ -72,12 +99,13 @@ def handle_new_messages():
         return 'Ok', 200
     
     except Exception as e:
-        print(f"Error: {e}")
+        logger.error("Error handling webhook messages: %s", e)
         return str(e), 500
 
 @app.route('/webhook', methods=['POST'])
 def webhook():
-    print("webhook request: ", request.json)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("webhook request: %s", request.json)
     # Process the webhook request here
     webhook_data = (request.json).get('data')
     message = {}
@@ -85,7 +113,7 @@ def webhook():
         message['type'] = 'text'
         message['text'] = {'body': webhook_data['text']}
     else:
-        print("Unsupported message type from webhook:", webhook_data)
+        logger.warning("Unsupported message type from webhook: %s", webhook_data)
         return 'Unsupported message type', 400
     user_id = webhook_data.get('sender_id')
     message['from'] = user_id
@@ -93,7 +121,7 @@ def webhook():
     message['source'] = 'chat_app'
     reciever_id = webhook_data.get('room').split('_')[1]
     message['to'] = reciever_id
-    incoming_messages(user_id, message, reciever_id)
+    enqueue_incoming_message(user_id, message, reciever_id)
     return 'Webhook received', 200
 
 @app.route('/', methods=['GET'])
@@ -110,27 +138,18 @@ def get_all_counsellors():
     """Get all counsellors with their details."""
     try:
         counsellors_data = db.get_counsellors_details()
+        logger.info(f"Retrieved {len(counsellors_data)} counsellors")
         
-        # Convert to list of dictionaries
-        counsellors_list = []
-        for counsellor in counsellors_data:
-            counsellors_list.append({
-                'id': counsellor[0],
-                'name': counsellor[1],
-                'username': counsellor[2],
-                'password': counsellor[3],  # You may want to exclude this in production
-                'email': counsellor[4],
-                'phone': counsellor[5],
-                'channels': counsellor[6],
-                'current_ticket': counsellor[7]
-            })
-        
-        logger.info(f"Retrieved {len(counsellors_list)} counsellors")
-        return jsonify({
+        # Rows are sqlite3.Row; app.json encodes each one as a dict of its columns
+        # (includes password - you may want to exclude this in production)
+        response = jsonify({
             'success': True,
-            'count': len(counsellors_list),
-            'counsellors': counsellors_list
-        }), 200
+            'count': len(counsellors_data),
+            'counsellors': counsellors_data
+        })
+        # Clients sending a matching If-None-Match get an empty 304 instead
+        response.add_etag()
+        return response.make_conditional(request)
     
     except Exception as e:
         logger.error(f"Error retrieving counsellors: {e}")
@@ -152,16 +171,7 @@ def get_counsellor(username):
                 'error': f'Counsellor with username "{username}" not found'
             }), 404
         
-        counsellor_data = {
-            'id': counsellor[0],
-            'name': counsellor[1],
-            'username': counsellor[2],
-            'password': counsellor[3],  # You may want to exclude this in production
-            'email': counsellor[4],
-            'phone': counsellor[5],
-            'channels': counsellor[6],
-            'current_ticket': counsellor[7]
-        }
+        counsellor_data = dict(counsellor)  # includes password - you may want to exclude this in production
         
         logger.info(f"Retrieved counsellor: {username}")
         return jsonify({
@@ -258,24 +268,22 @@ def update_counsellor(username):
                 'error': 'No data provided'
             }), 400
         
-        # Check if counsellor exists
-        counsellor = db.get_counsellor(username)
-        if not counsellor:
-            return jsonify({
-                'success': False,
-                'error': f'Counsellor with username "{username}" not found'
-            }), 404
-        
-        # Update allowed fields
+        # Update allowed fields in one statement; touching no rows means the counsellor doesn't exist
         allowed_fields = ['name', 'email', 'phone', 'password']
+        fields = {field: data[field] for field in allowed_fields if field in data}
         updated_fields = []
         
-        for field in allowed_fields:
-            if field in data:
-                if db.update_counsellor(username, field, data[field]):
-                    updated_fields.append(field)
-                else:
-                    logger.warning(f"Failed to update field {field} for counsellor {username}")
+        if fields:
+            updated = db.update_counsellor_fields(username, fields)
+            if updated == 0:
+                return jsonify({
+                    'success': False,
+                    'error': f'Counsellor with username "{username}" not found'
+                }), 404
+            if updated:
+                updated_fields = list(fields)
+            else:
+                logger.warning(f"Failed to update fields {', '.join(fields)} for counsellor {username}")
         
         if updated_fields:
             logger.info(f"Updated counsellor {username}: {', '.join(updated_fields)}")
@@ -302,16 +310,15 @@ def update_counsellor(username):
 def delete_counsellor(username):
     """Delete a counsellor."""
     try:
-        # Check if counsellor exists
-        counsellor = db.get_counsellor(username)
-        if not counsellor:
+        # Delete counsellor; nothing deleted means the counsellor doesn't exist
+        removed = counsellors.remove_counsellor(username)
+        if removed == 0:
             return jsonify({
                 'success': False,
                 'error': f'Counsellor with username "{username}" not found'
             }), 404
         
-        # Delete counsellor
-        if counsellors.remove_counsellor(username):
+        if removed:
             logger.info(f"Successfully deleted counsellor: {username}")
             return jsonify({
                 'success': True,
@@ -353,22 +360,21 @@ def add_counsellor_channel(username):
                 'error': f'Missing required fields: {", ".join(missing_fields)}'
             }), 400
         
-        # Check if counsellor exists
-        counsellor = db.get_counsellor(username)
-        if not counsellor:
-            return jsonify({
-                'success': False,
-                'error': f'Counsellor with username "{username}" not found'
-            }), 404
-        
-        # Add channel
-        if counsellors.add_channel(
+        # Add channel; nothing inserted means the counsellor doesn't exist
+        added = counsellors.add_channel(
             username,
             data['channel'],
             data['channel_id'],
             data.get('auth_key'),
             data.get('order')
-        ):
+        )
+        if added == 0:
+            return jsonify({
+                'success': False,
+                'error': f'Counsellor with username "{username}" not found'
+            }), 404
+        
+        if added:
             logger.info(f"Successfully added channel {data['channel']} to counsellor {username}")
             return jsonify({
                 'success': True,
@@ -13,6 +13,7 @@ Usage:
     lang, confidence = detect_language_with_confidence(text)  # Returns ('en', 0.999)
 """
 
+from functools import lru_cache
 from langdetect import detect, detect_langs, DetectorFactory
 from langdetect.lang_detect_exception import LangDetectException
 import logging
@@ -23,7 +24,25 @@ DetectorFactory.seed = 0
 # Configure logging
 logger = logging.getLogger(__name__)
 
-
+# Keyword-based detection for very short texts (common greetings and words)
+FRENCH_KEYWORDS = frozenset({
+    'bonjour', 'salut', 'bonsoir', 'merci', 'oui', 'non', 'comment',
+    'aide', 'besoin', 'enceinte', 'avortement', 'grossesse', 'règles',
+    'svp', 's\'il', 'sil', 'vous', 'plaît', 'allô', 'allo', 'bsr', 'bjr',
+    'je', 'tu', 'nous', 'mes', 'ça', 'ca', 'alors', 'quoi', 'pourquoi',
+    'comment', 'quand', 'où', 'qui', 'combien'
+})
+
+ENGLISH_KEYWORDS = frozenset({
+    'hello', 'hi', 'hey', 'thanks', 'thank', 'yes', 'no', 'how',
+    'help', 'need', 'pregnant', 'abortion', 'pregnancy', 'period',
+    'please', 'pls', 'what', 'why', 'when', 'where', 'who', 'how'
+})
+
+
+# DetectorFactory.seed makes detection deterministic, so results can be cached;
+# short replies ("oui", "hello") repeat a lot.
+@lru_cache(maxsize=1024)
 def detect_language(text, default='en', min_confidence=0.7):
     """
     Detect the language of the given text with enhanced short-text handling.
@@ -53,30 +72,15 @@ def detect_language(text, default='en', min_confidence=0.7):
         # Normalize text for keyword matching
         normalized_text = text.lower().strip()
 
-        # Keyword-based detection for very short texts (common greetings and words)
-        french_keywords = {
-            'bonjour', 'salut', 'bonsoir', 'merci', 'oui', 'non', 'comment',
-            'aide', 'besoin', 'enceinte', 'avortement', 'grossesse', 'règles',
-            'svp', 's\'il', 'sil', 'vous', 'plaît', 'allô', 'allo', 'bsr', 'bjr',
-            'je', 'tu', 'nous', 'mes', 'ça', 'ca', 'alors', 'quoi', 'pourquoi',
-            'comment', 'quand', 'où', 'qui', 'combien'
-        }
-
-        english_keywords = {
-            'hello', 'hi', 'hey', 'thanks', 'thank', 'yes', 'no', 'how',
-            'help', 'need', 'pregnant', 'abortion', 'pregnancy', 'period',
-            'please', 'pls', 'what', 'why', 'when', 'where', 'who', 'how'
-        }
-
         # Check if any word in the text matches keywords
         words = normalized_text.split()
         for word in words:
             # Remove common punctuation
             clean_word = word.strip('.,!?;:()')
-            if clean_word in french_keywords:
+            if clean_word in FRENCH_KEYWORDS:
                 logger.info(f"Detected French keyword '{clean_word}' in text: '{text[:50]}...'")
                 return 'fr'
-            elif clean_word in english_keywords:
+            elif clean_word in ENGLISH_KEYWORDS:
                 logger.info(f"Detected English keyword '{clean_word}' in text: '{text[:50]}...'")
                 return 'en'
 
@@ -11,6 +11,7 @@ authentication tokens, timeouts, and endpoint specifications for different servi
 
 Functions:
     route_message(route_name, message): Route a message to the configured API endpoint
+    route_messages(route_name, user_id, messages): Route several messages to one user in order
 
 Configuration:
     Requires 'routes.json' file with route configurations containing:
@@ -33,6 +34,7 @@ import json
 import time
 import random
 import requests
+from requests.adapters import HTTPAdapter
 import logging
 import os
 import dotenv
@@ -49,6 +51,14 @@ if logging_file:
 else:
     logging.basicConfig(level=getattr(logging, logging_level, logging.INFO))
 
+# One pooled session for every routed message, so consecutive sends to the
+# same API reuse a warm connection instead of a new TCP/TLS handshake each.
+# Retries stay in retry_with_backoff, so the adapter doesn't add its own.
+_session = requests.Session()
+_adapter = HTTPAdapter(pool_connections=10, pool_maxsize=50)
+_session.mount("http://", _adapter)
+_session.mount("https://", _adapter)
+
 
 def retry_with_backoff(func, max_retries=3, base_delay=1, max_delay=60, backoff_factor=2):
     """
@@ -64,13 +74,13 @@ def retry_with_backoff(func, max_retries=3, base_delay=1, max_delay=60, backoff_
     Returns:
         The result of the function call or raises the last exception
     """
-    logging.debug(f"Starting retry logic with max_retries={max_retries}, base_delay={base_delay}")
+    logging.debug("Starting retry logic with max_retries=%s, base_delay=%s", max_retries, base_delay)
     for attempt in range(max_retries + 1):
         try:
-            logging.debug(f"Attempt {attempt + 1}/{max_retries + 1}")
+            logging.debug("Attempt %d/%d", attempt + 1, max_retries + 1)
             result = func()
             if attempt > 0:
-                logging.info(f"Request succeeded on attempt {attempt + 1}")
+                logging.info("Request succeeded on attempt %d", attempt + 1)
             return result
         except (requests.exceptions.RequestException, requests.exceptions.Timeout) as e:
             if attempt == max_retries:
@@ -82,10 +92,8 @@ def retry_with_backoff(func, max_retries=3, base_delay=1, max_delay=60, backoff_
             jitter = random.uniform(0, 0.1) * delay  # Add up to 10% jitter
             total_delay = delay + jitter
             
-            logging.warning(f"Request failed (attempt {attempt + 1}/{max_retries + 1}): {str(e)}")
-            logging.info(f"Retrying in {total_delay:.2f} seconds...")
-            print(f"Request failed (attempt {attempt + 1}/{max_retries + 1}): {str(e)}")
-            print(f"Retrying in {total_delay:.2f} seconds...")
+            logging.warning("Request failed (attempt %d/%d): %s", attempt + 1, max_retries + 1, e)
+            logging.info("Retrying in %.2f seconds...", total_delay)
             time.sleep(total_delay)
     
     # This should never be reached due to the raise in the loop
@@ -93,109 +101,167 @@ def retry_with_backoff(func, max_retries=3, base_delay=1, max_delay=60, backoff_
     raise Exception("Max retries exceeded")
 
 
-def route_message(route_name, user_id, message, message_type="text", max_retries=3):
+def _load_route_config(route_name):
     """
-    Route a message to the appropriate API endpoint based on the route configuration.
+    Load the configuration for one route from routes.json.
 
     Args:
         route_name (str): The name of the route to use.
-        message (str): The message to send to the API.
-        user_id (str): The recipient user ID.
-        max_retries (int): Maximum number of retry attempts (default: 3).
 
     Returns:
-        dict: The JSON response from the API or an error message.
+        tuple: (config dict, None) on success, or (None, error response dict).
     """
-    logging.info(f"Routing message to {route_name} for user {user_id}")
-    logging.debug(f"Message type: {message_type}, Max retries: {max_retries}")
-    
     try:
         logging.debug("Loading routes configuration from routes.json")
         with open("routes.json", encoding='utf-8', mode='r') as file:
             configurations = json.load(file)
-            logging.debug(f"Loaded {len(configurations)} route configurations")
-
-            # To Do handle other messages like images, files, etc.
-            # Access specific keys in the config
-            if route_name not in configurations:
-                logging.error(f"Route {route_name} not found in configuration")
-                return {"error": f"Route {route_name} not found in configuration."}
-                
-            config = configurations[route_name]
-            logging.debug(f"Found configuration for route: {route_name}")
-            
-            api_url = config.get('api_url')
-            token = config.get('api_token')
-            timeout = config.get('timeout', 10)
-            endpoint = config.get('endpoint')[message_type] if 'endpoint' in config and message_type in config['endpoint'] else 'messages/text'
-
-            logging.debug(f"API URL: {api_url}, Endpoint: {endpoint}, Timeout: {timeout}")
-
-            headers = {
-                'Authorization': f"Bearer {token}",
-                'Content-Type': 'application/json'
-            }
-            
-
-            url = f"{api_url}/{endpoint}"
-            if message_type == 'text':
-                payload = {'body': message}
-            elif message_type == 'media' or message_type == 'image' or message_type == 'file':
-                # Split the media path and MIME type for image
-                image_path, mime_type = payload.pop('media').split(';')
-        
-                with open(image_path, 'rb') as image_file:
-                    # Create a MultipartEncoder for the file upload
-                    m = MultipartEncoder(
-                        fields={
-                            **payload,
-                            'media': (image_path, image_file, mime_type)
-                        }
-                    )
-                    headers['Content-Type'] = m.content_type
-            elif message_type == 'options':
-                payload = {
-                    'body': message['body'],
-                    'action': message['action'],
-                    'type': message.get('type', 'button')
-                }
-            payload['to'] = user_id
-            
-            logging.debug(f"Prepared request to {url}")
-            logging.debug(f"Payload: {payload}")
-
-            # Define the request function for retry logic
-            def make_request():
-                logging.debug(f"Making POST request to {url}")
-                response = requests.post(url, json=payload, headers=headers, timeout=timeout)
-                # Raise an exception for bad status codes (4xx, 5xx)
-                response.raise_for_status()
-                logging.info(f"Request successful. Status code: {response.status_code}")
-                return response.json()
-
-            # Use retry logic for the request
-            try:
-                result = retry_with_backoff(make_request, max_retries=max_retries)
-                logging.info(f"Message successfully routed to {route_name} for user {user_id}")
-                return result
-            except requests.exceptions.RequestException as e:
-                error_msg = f"Request failed after {max_retries + 1} attempts: {str(e)}"
-                logging.error(error_msg)
-                return {"error": error_msg}
-
+            logging.debug("Loaded %d route configurations", len(configurations))
     except FileNotFoundError:
         error_msg = f"Configuration file for {route_name} not found."
         logging.error(error_msg)
-        return {"error": error_msg}
+        return None, {"error": error_msg}
     except json.JSONDecodeError:
         error_msg = f"Error decoding JSON configuration for {route_name}."
         logging.error(error_msg)
-        return {"error": error_msg}
+        return None, {"error": error_msg}
+    except Exception as e:
+        error_msg = f"Error routing message to {route_name}: {str(e)}"
+        logging.error(error_msg)
+        return None, {"error": error_msg}
+
+    if route_name not in configurations:
+        logging.error(f"Route {route_name} not found in configuration")
+        return None, {"error": f"Route {route_name} not found in configuration."}
+    logging.debug("Found configuration for route: %s", route_name)
+    return configurations[route_name], None
+
+
+def _send_with_config(config, route_name, user_id, message, message_type="text", max_retries=3):
+    """
+    Send one message using an already loaded route configuration.
+
+    Returns:
+        dict: The JSON response from the API or an error message.
+    """
+    try:
+        # To Do handle other messages like images, files, etc.
+        # Access specific keys in the config
+        api_url = config.get('api_url')
+        token = config.get('api_token')
+        timeout = config.get('timeout', 10)
+        endpoint = config.get('endpoint')[message_type] if 'endpoint' in config and message_type in config['endpoint'] else 'messages/text'
+
+        logging.debug("API URL: %s, Endpoint: %s, Timeout: %s", api_url, endpoint, timeout)
+
+        headers = {
+            'Authorization': f"Bearer {token}",
+            'Content-Type': 'application/json'
+        }
+        
+
+        url = f"{api_url}/{endpoint}"
+        if message_type == 'text':
+            payload = {'body': message}
+        elif message_type == 'media' or message_type == 'image' or message_type == 'file':
+            # Split the media path and MIME type for image
+            image_path, mime_type = payload.pop('media').split(';')
+    
+            with open(image_path, 'rb') as image_file:
+                # Create a MultipartEncoder for the file upload
+                m = MultipartEncoder(
+                    fields={
+                        **payload,
+                        'media': (image_path, image_file, mime_type)
+                    }
+                )
+                headers['Content-Type'] = m.content_type
+        elif message_type == 'options':
+            payload = {
+                'body': message['body'],
+                'action': message['action'],
+                'type': message.get('type', 'button')
+            }
+        payload['to'] = user_id
+        
+        logging.debug("Prepared request to %s", url)
+        logging.debug("Payload: %s", payload)
+
+        # Define the request function for retry logic
+        def make_request():
+            logging.debug("Making POST request to %s", url)
+            response = _session.post(url, json=payload, headers=headers, timeout=timeout)
+            # Raise an exception for bad status codes (4xx, 5xx)
+            response.raise_for_status()
+            logging.info("Request successful. Status code: %s", response.status_code)
+            return response.json()
+
+        # Use retry logic for the request
+        try:
+            result = retry_with_backoff(make_request, max_retries=max_retries)
+            logging.info("Message successfully routed to %s for user %s", route_name, user_id)
+            return result
+        except requests.exceptions.RequestException as e:
+            error_msg = f"Request failed after {max_retries + 1} attempts: {str(e)}"
+            logging.error(error_msg)
+            return {"error": error_msg}
+
     except Exception as e:
         error_msg = f"Error routing message to {route_name}: {str(e)}"
         logging.error(error_msg)
         return {"error": error_msg}
 
+
+def route_message(route_name, user_id, message, message_type="text", max_retries=3):
+    """
+    Route a message to the appropriate API endpoint based on the route configuration.
+
+    Args:
+        route_name (str): The name of the route to use.
+        message (str): The message to send to the API.
+        user_id (str): The recipient user ID.
+        max_retries (int): Maximum number of retry attempts (default: 3).
+
+    Returns:
+        dict: The JSON response from the API or an error message.
+    """
+    logging.info("Routing message to %s for user %s", route_name, user_id)
+    logging.debug("Message type: %s, Max retries: %s", message_type, max_retries)
+    
+    config, error = _load_route_config(route_name)
+    if error:
+        return error
+    return _send_with_config(config, route_name, user_id, message, message_type, max_retries)
+
+
+def route_messages(route_name, user_id, messages, max_retries=3):
+    """
+    Route several messages to one user, in order, loading the route configuration once.
+
+    Sending stops at the first failure so the user never receives a later
+    message without the earlier ones.
+
+    Args:
+        route_name (str): The name of the route to use.
+        user_id (str): The recipient user ID.
+        messages (list): (message, message_type) tuples.
+        max_retries (int): Maximum number of retry attempts per message (default: 3).
+
+    Returns:
+        list: One response dict per message attempted; the last one holds
+        the 'error' if a send failed.
+    """
+    logging.info("Routing %d messages to %s for user %s", len(messages), route_name, user_id)
+    config, error = _load_route_config(route_name)
+    if error:
+        return [error]
+    responses = []
+    for message, message_type in messages:
+        response = _send_with_config(config, route_name, user_id, message, message_type, max_retries)
+        responses.append(response)
+        if "error" in response:
+            break
+    return responses
+
 if __name__ == "__main__":
     # check if config file is loaded correctly
     logging.info("Testing routes.json configuration loading")
@@ -8,20 +8,82 @@ business logic for user-related operations.
 
 Functions:
     get_user_profile(user): Retrieve user profile information
+    get_user_profile_cached(user): Retrieve a user profile through a short TTL cache
+    invalidate_user_profile(user): Drop a user's cached profile
     create_user(user): Create a new user
     update_user_handler(user, handler): Update user's handler assignment
     delete_user_profile(user): Delete a user's profile
     get_all_users(): Retrieve all users
     get_user_count(): Get total number of users
     update_user(user, field, data): Update specific user field
+    update_user_fields(user, fields): Update several user fields at once
     update_handler(user, handler): Update user's handler (alias function)
     
 Dependencies:
     db: Database module for data persistence
 """
 
+import threading
+import time
+
 from database import db
 
+# Profiles read on the message path are cached briefly; every write through
+# this module drops the user's entry, so the cache never outlives our own updates.
+# Writes made elsewhere (other worker processes, ticket assignment in
+# database.db) are not seen until the entry expires. The handler routes every
+# message, so it is always read live, and profiles whose state moves on every
+# message (onboarding) are never cached.
+PROFILE_CACHE_TTL = 30  # seconds
+PROFILE_CACHE_SIZE = 10000
+UNCACHED_HANDLERS = frozenset({"on-boarder"})
+_profile_cache = {}  # user -> (profile dict, expires)
+_profile_lock = threading.Lock()
+
+def get_user_profile_cached(user):
+    """Get the user's profile, served from a cache for up to PROFILE_CACHE_TTL seconds.
+
+    The handler is always read from the database, and users whose handler is
+    in UNCACHED_HANDLERS get their whole profile read from the database.
+
+    Args:
+        user (str): The user's unique identifier.
+
+    Returns:
+        dict: The user's profile or None if not found.
+    """
+    handler = db.get_user_handler(user)
+    if handler is None:
+        invalidate_user_profile(user)
+        return None
+    now = time.monotonic()
+    if handler not in UNCACHED_HANDLERS:
+        with _profile_lock:
+            entry = _profile_cache.get(user)
+            if entry is not None and now < entry[1]:
+                return dict(entry[0], handler=handler)
+    profile = db.get_user_profile(user)
+    if profile is None:
+        # Not cached: the user is about to be registered
+        return None
+    profile = dict(profile)
+    if profile['handler'] in UNCACHED_HANDLERS:
+        return profile
+    with _profile_lock:
+        if len(_profile_cache) >= PROFILE_CACHE_SIZE and user not in _profile_cache:
+            _profile_cache.pop(next(iter(_profile_cache)))
+        _profile_cache[user] = (profile, now + PROFILE_CACHE_TTL)
+    return dict(profile)
+
+def invalidate_user_profile(user):
+    """Drop the user's cached profile after it changes.
+
+    Args:
+        user (str): The user's unique identifier.
+    """
+    with _profile_lock:
+        _profile_cache.pop(user, None)
+
 def get_user_profile(user):
     """Get the user's profile information.
 
@@ -46,6 +108,7 @@ def create_user(user):
     """
     if not db.user_exist(user):
         db.save_user(user)
+        invalidate_user_profile(user)
         return True
     return False
 
@@ -61,6 +124,7 @@ def update_user_handler(user, handler):
     """
     if db.user_exist(user):
         db.update_user_handler(user, handler)
+        invalidate_user_profile(user)
         return True
     return False
 
@@ -75,6 +139,7 @@ def delete_user_profile(user):
     """
     if db.user_exist(user):
         db.delete_user_profile(user)
+        invalidate_user_profile(user)
         return True
     return False
 
@@ -108,9 +173,24 @@ def update_user(user, field, data):
 
     if db.user_exist(user):
         db.update_user(user, field, data)
+        invalidate_user_profile(user)
         return True
     return False
 
+def update_user_fields(user, fields):
+    """Update several of the user's fields in a single write.
+
+    Args:
+        user (str): The user's unique identifier.
+        fields (dict): Field name -> new data.
+
+    Returns:
+        bool: True if the user was updated successfully, False otherwise.
+    """
+    updated = db.update_user_fields(user, fields)
+    invalidate_user_profile(user)
+    return updated > 0
+
 def update_handler(user, handler):
     """Update the user's handler information.
 
@@ -123,5 +203,6 @@ def update_handler(user, handler):
     """
     if db.user_exist(user):
         db.update_user_handler(user, handler)
+        invalidate_user_profile(user)
         return True
     return False